@@ -3,36 +3,102 @@ import requests
 import json
 import os
 import re
+import sys
+import time
 import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rasa"))
+from actions import pricing  # noqa: E402
+from actions.cart import Cart  # noqa: E402
+from actions.pricing import PRICER, get_coupon, price_cart  # noqa: E402
+from actions.user_store import VersionConflict, open_user_store  # noqa: E402
 
 # ========================================================
 # CONFIG
 # ========================================================
-RASA_URL = "http://127.0.0.1:5005/webhooks/rest/webhook"
-USER_DB_PATH = "users_data.json"
+RASA_URL = os.getenv("RASA_URL", "http://127.0.0.1:5005/webhooks/rest/webhook")
+RASA_CONNECT_TIMEOUT = float(os.getenv("RASA_CONNECT_TIMEOUT", "3.05"))
+RASA_READ_TIMEOUT = float(os.getenv("RASA_READ_TIMEOUT", "30"))
+RASA_RETRIES = int(os.getenv("RASA_RETRIES", "2"))
+RASA_BACKOFF = float(os.getenv("RASA_BACKOFF", "0.3"))
+RASA_CLIENT_WORKERS = int(os.getenv("RASA_CLIENT_WORKERS", "8"))
+# Single-node mode: run routed "/intent{...}" messages through the custom actions in-process
+EMBEDDED_ACTIONS = os.getenv("EMBEDDED_ACTIONS", "0").lower() in {"1", "true", "yes"}
+USER_DB_PATH = "users_data.json"  # legacy JSON, imported into the user store once
+USER_STORE_PATH = os.getenv("USER_STORE_PATH", "users.db")
 
 # ========================================================
 # USER DATABASE FUNCTIONS
 # ========================================================
-def load_user_db():
-    if os.path.exists(USER_DB_PATH):
-        with open(USER_DB_PATH, "r") as f:
-            return json.load(f)
-    else:
-        # default users
-        return {
-            "sachin": "1234",
-            "admin": "admin123",
-            "guest": "guest"
-        }
+@st.cache_resource
+def get_user_store():
+    # One SQLite-backed store per process, shared by every session
+    return open_user_store(USER_STORE_PATH, legacy_json=USER_DB_PATH)
+
+USER_STORE = get_user_store()
+
+@st.cache_resource
+def get_user_cache():
+    # username -> (version, record), shared by every session of this process
+    return {}
+
+def load_user_version(username):
+    """
+    (record, version) for one user. The record is only re-read from the store
+    when the user's version has moved (any write, from any process), so a
+    rerun costs at most one read. Nested values are shared with the cache:
+    treat them as read-only.
+    """
+    cache = get_user_cache()
+    hit = cache.get(username)
+    if hit is None or hit[0] != USER_STORE.version(username):
+        record, version = USER_STORE.get_user_version(username)
+        hit = cache[username] = (version, record or {})
+    return dict(hit[1]), hit[0]
+
+def load_user(username):
+    """One user's record (cart, orders, addresses, ...), read by key through the cache."""
+    return load_user_version(username)[0]
+
+def invalidate_user(username):
+    get_user_cache().pop(username, None)
+
+def save_user(username, **fields):
+    """Persist only the given fields of one user."""
+    USER_STORE.set_fields(username, fields)
+    invalidate_user(username)
+
+def record_cart_event(username, kind, expected_version=None, **payload):
+    """
+    Append a cart/order event (cart_add, cart_remove, coupon_apply, coupon_remove, checkout) to the journal.
+    With `expected_version`, raises VersionConflict if the user changed since that read.
+    """
+    try:
+        USER_STORE.append_event(username, kind, payload, expected_version=expected_version)
+    finally:
+        invalidate_user(username)
 
-def save_user_db(users_data):
-    with open(USER_DB_PATH, "w") as f:
-        json.dump(users_data, f, indent=4)
+def load_cart(username):
+    """The user's cart as a Cart (old list-shaped carts are converted on read)."""
+    return Cart.from_payload(load_user(username).get("cart"))
 
-# Load DB into session
-if "USER_DB" not in st.session_state:
-    st.session_state.USER_DB = load_user_db()
+def add_to_cart(username, name, price, sku=None):
+    """Journal one unit of a product and refresh the session's view of the cart."""
+    record_cart_event(username, "cart_add", item={"name": name, "price": price, "sku": sku})
+    st.session_state.cart_items = load_cart(username).items()
+
+def add_to_cart_message(name, sku=None):
+    """What an Add button sends to Rasa: the product's SKU when known, so nothing is re-matched by name."""
+    if sku:
+        return "/add_to_cart" + json.dumps({"sku": sku})
+    return f"add {name} to cart"
+
+CART_CHANGED_MSG = "⚠️ Your cart changed in another session. Please review it and checkout again."
 
 # ========================================================
 # SESSION STATE INITIALIZATION
@@ -54,6 +120,8 @@ if "all_products" not in st.session_state:
     st.session_state.all_products = []
 if "show_limit" not in st.session_state:
     st.session_state.show_limit = 5
+if "search_cursor" not in st.session_state:
+    st.session_state.search_cursor = None
 if "selected_addr_id" not in st.session_state:
     st.session_state.selected_addr_id = None
 if "checkout_result" not in st.session_state:
@@ -67,7 +135,6 @@ st.set_page_config(page_title="🛒 E-commerce Chatbot", page_icon="🤖", layou
 # ========================================================
 if not st.session_state.authenticated:
     st.title("🔐 Welcome to ShopBot")
-    users = load_user_db()
     mode = st.radio("Select mode:", ["Login", "Sign Up"], horizontal=True)
 
     # ---------- LOGIN ----------
@@ -80,7 +147,7 @@ if not st.session_state.authenticated:
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("Login"):
-                    if username in st.session_state.USER_DB and st.session_state.USER_DB[username]["password"] == password:
+                    if USER_STORE.check_password(username, password):
                         st.session_state.authenticated = True
                         st.session_state.username = username
                         st.success(f"Welcome back, {username}! 👋")
@@ -99,21 +166,14 @@ if not st.session_state.authenticated:
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Sign Up"):
-                if new_user in st.session_state.USER_DB:
+                if USER_STORE.has_user(new_user):
                     st.warning("⚠️ Username already exists. Try another.")
                 elif new_pass != confirm_pass:
                     st.error("❌ Passwords do not match.")
                 elif len(new_user.strip()) == 0 or len(new_pass.strip()) == 0:
                     st.warning("Please enter valid credentials.")
                 else:
-                    users = load_user_db()
-                    users[new_user] = {
-                        "password": new_pass,
-                        "cart": [],
-                        "orders": []
-                    }
-                    save_user_db(users)
-                    st.session_state.USER_DB = users
+                    USER_STORE.create_user(new_user, new_pass)
                     st.success("✅ Account created successfully! You can now log in.")
                     st.session_state.show_signup = False
                     st.rerun()
@@ -124,9 +184,8 @@ if not st.session_state.authenticated:
 
     st.stop()  # Stop here if not authenticated
 
-users_data = load_user_db()
-user_data = users_data.get(st.session_state.username, {"cart": [], "orders": [], "last_search": None})
-st.session_state.cart_items = user_data.get("cart", [])
+user_data = load_user(st.session_state.username)
+st.session_state.cart_items = Cart.from_payload(user_data.get("cart")).items()
 st.session_state.orders = user_data.get("orders", [])
 
 # 🧠 Personalized welcome message
@@ -137,20 +196,15 @@ else:
     st.info(f"👋 Welcome, **{st.session_state.username}**! What would you like to shop for today?")
 
 #--- Calculation of total price-----
-def compute_totals(items, coupon, free_ship_threshold=999, tax_rate=0.18):
-    subtotal = round(sum(float(it.get("price", 0.0)) * int(it.get("qty", 1)) for it in items), 2)
-    def apply_coupon(subtotal, c):
-        if not c: return 0.0
-        t, v = c.get("type"), float(c.get("value", 0))
-        if t == "percent": return round(subtotal * v / 100.0, 2)
-        if t == "flat": return round(min(v, subtotal), 2)
-        return 0.0
-    discount = apply_coupon(subtotal, coupon)
-    tax_base = max(0.0, subtotal - discount)
-    shipping = 0.0 if tax_base >= free_ship_threshold else 49.0
-    tax = round(tax_base * tax_rate, 2)
-    total = round(tax_base + shipping + tax, 2)
-    return subtotal, discount, shipping, tax, total
+def compute_totals(items, coupon, version=None):
+    """
+    (subtotal, discount, shipping, tax, total) from the shared pricing engine.
+    With the user's store version the quote is memoized, so the sidebar and
+    checkout price a given cart once.
+    """
+    if version is None:
+        return price_cart(items, coupon).as_floats()
+    return PRICER.quote(st.session_state.username, version, items, coupon).as_floats()
 
 # ========================================================
 # MAIN CHATBOT PAGE (only after login)
@@ -159,20 +213,115 @@ st.title(f"🛒 E-commerce Chatbot — {st.session_state.username}")
 st.markdown("Ask about products, prices, stock, or track your orders!")
 
 # 🔹 Function to send message to Rasa backend
-def send_message_to_rasa(user_message):
+@st.cache_resource
+def get_rasa_session():
+    """
+    One pooled keep-alive session per process. Connection failures are
+    retried with backoff for every call (the request never reached Rasa,
+    so a retry can't replay a message); 502/503/504 and read errors are
+    only retried for idempotent methods, which excludes the webhook POST.
+    """
+    retry = Retry(
+        total=RASA_RETRIES,
+        connect=RASA_RETRIES,
+        read=RASA_RETRIES,
+        status=RASA_RETRIES,
+        backoff_factor=RASA_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_rasa_latencies():
+    # Recent (timestamp, latency ms, ok) per webhook call, across sessions
+    return deque(maxlen=200)
+
+@st.cache_resource
+def get_rasa_executor():
+    # Webhook calls run here so the script can keep rendering while Rasa works
+    return ThreadPoolExecutor(max_workers=RASA_CLIENT_WORKERS, thread_name_prefix="rasa-client")
+
+def _call_rasa(session, sender, user_message):
+    # Returns (responses, ok); failures become a bot-style error message
     try:
-        response = requests.post(
+        response = session.post(
             RASA_URL,
-            json={"sender": st.session_state.username, "message": user_message},
-            timeout=120
+            json={"sender": sender, "message": user_message},
+            timeout=(RASA_CONNECT_TIMEOUT, RASA_READ_TIMEOUT)
         )
         if response.status_code == 200:
-            data = response.json()
-            return data
+            return response.json(), True
         else:
-            return [{"text": "⚠️ Could not connect to the chatbot backend."}]
+            return [{"text": "⚠️ Could not connect to the chatbot backend."}], False
+    except requests.exceptions.ReadTimeout:
+        return [{"text": "⏳ The chatbot is taking too long to respond. Please try again."}], False
     except Exception as e:
-        return [{"text": f"❌ Connection error: {e}"}]
+        return [{"text": f"❌ Connection error: {e}"}], False
+
+@st.cache_resource
+def get_embedded_actions():
+    # Imports rasa/actions/actions.py (catalog, orders, user store) into this process
+    from actions.embedded import EmbeddedActions
+    return EmbeddedActions()
+
+def _post_to_rasa(session, latencies, sender, user_message, embedded=None):
+    # Runs on a worker thread: no st.* calls in here, everything it needs is
+    # passed in. Returns (responses, latency ms).
+    start = time.perf_counter()
+    responses = embedded.handle_message(sender, user_message) if embedded is not None else None
+    if responses is not None:
+        ok = True
+    else:
+        responses, ok = _call_rasa(session, sender, user_message)
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    latencies.append((time.time(), latency_ms, ok))
+    return responses, latency_ms
+
+def submit_to_rasa(user_message):
+    """Start a webhook call in the background and return its Future; independent calls run concurrently."""
+    # Cached resources are resolved here, on the script thread
+    embedded = get_embedded_actions() if EMBEDDED_ACTIONS else None
+    return get_rasa_executor().submit(
+        _post_to_rasa, get_rasa_session(), get_rasa_latencies(),
+        st.session_state.username, user_message, embedded,
+    )
+
+def collect_rasa(future, placeholder=None):
+    """
+    Wait for a submitted call. With a placeholder, a live "thinking" timer is
+    shown until the bot answers. Returns the bot responses.
+    """
+    start = time.perf_counter()
+    while not wait([future], timeout=0.25).done:
+        if placeholder is not None:
+            placeholder.markdown(f"⏳ _Thinking… {time.perf_counter() - start:.1f}s_")
+    if placeholder is not None:
+        placeholder.empty()
+    responses, latency_ms = future.result()
+    st.session_state.rasa_latency_ms = latency_ms
+    return responses
+
+def send_message_to_rasa(user_message):
+    return collect_rasa(submit_to_rasa(user_message))
+
+# 🔹 Fetch the next page of the current search (cursor issued by action_search_products)
+def fetch_next_products_page():
+    cursor = st.session_state.get("search_cursor")
+    if not cursor:
+        return
+    payload = json.dumps({"search_cursor": cursor})
+    st.session_state.search_cursor = None
+    for resp in send_message_to_rasa(f"/show_more_products{payload}"):
+        custom = resp.get("custom")
+        if isinstance(custom, dict) and "product_results" in custom:
+            st.session_state.all_products.extend(custom["product_results"])
+            st.session_state.search_cursor = custom.get("next_cursor")
 
 # ---------------- PENDING BOT RESPONSES ----------------
 pending = st.session_state.pop("pending_bot_responses", None)
@@ -218,6 +367,21 @@ for msg in history_snapshot:
         st.chat_message("assistant").write(content)
         continue
 
+    # Assistant message with bulk order tracking payload
+    if role == "assistant" and isinstance(content, dict) and "order_tracking" in content:
+        with st.chat_message("assistant"):
+            st.dataframe(
+                [{
+                    "Order": o.get("order_id"),
+                    "Product": o.get("product_name") or "—",
+                    "Status": o.get("status"),
+                    "Expected delivery": o.get("expected_delivery") or "—",
+                } for o in content["order_tracking"]],
+                hide_index=True,
+                use_container_width=True,
+            )
+        continue
+
     # Assistant message with recommendations payload
     if role == "assistant" and isinstance(content, dict) and "recommendations" in content:
         with st.chat_message("assistant"):
@@ -228,7 +392,8 @@ for msg in history_snapshot:
                 col1, col2 = st.columns([3, 1])
                 product_name = rec.get('product_name', '')
                 price = float(rec.get('price', 0.0) or 0.0)
-                sig = (product_name.lower(), price) # new code
+                sku = rec.get('sku')
+                sig = sku or (product_name.lower(), price) # new code
                 
                 if sig in seen: # new code
                     continue 
@@ -247,13 +412,7 @@ for msg in history_snapshot:
                     
                         # 2) NEW: Update local DB + session cart (mirror other Add handlers)
                         
-                        users = load_user_db()
-                        u = users.setdefault(st.session_state.username, {})
-                        u.setdefault("cart", [])
-                        u["cart"].append({"name": product_name, "price": price})
-                        users[st.session_state.username] = u
-                        save_user_db(users)
-                        st.session_state.cart_items = users[st.session_state.username].get("cart", [])
+                        add_to_cart(st.session_state.username, product_name, price, sku=sku)
                         
                         # 3) Trigger backend add (optional sync)
                         #st.session_state["pending_bot_responses"] = send_message_to_rasa(f"add {product_name} to cart")
@@ -278,97 +437,141 @@ if st.session_state.get("added_from_recs", False):
     # Clear the flag so the prompt appears only once
     st.session_state.added_from_recs = False
     
+# ---------------- FAST-PATH COMMAND ROUTER ----------------
+# Fully structured commands are matched here with compiled patterns and
+# handled without a trip through Rasa's NLU. A handler returns either a
+# list of assistant replies (handled locally), a "/intent{...}" string
+# (sent to Rasa, which skips NLU for that syntax), or None to let the
+# next route / the NLU have the message. Register more with @fast_route.
+FAST_ROUTES = []
+
+def fast_route(pattern):
+    def register(handler):
+        FAST_ROUTES.append((re.compile(pattern, re.IGNORECASE), handler))
+        return handler
+    return register
+
+def route_command(text):
+    command = text.strip().rstrip(".!?").strip()
+    for pattern, handler in FAST_ROUTES:
+        m = pattern.fullmatch(command)
+        if m:
+            routed = handler(m)
+            if routed is not None:
+                return routed
+    return None
+
+@fast_route(r"checkout|check out|proceed to checkout|place order")
+def route_checkout(m):
+    u, u_version = load_user_version(st.session_state.username)
+    cart = Cart.from_payload(u.get("cart")).items()
+    orders = u.setdefault("orders", [])
+    coupon = u.get("coupon")
+    
+    # ADDRESS GUARD (same as sidebar)
+    addrs = u.setdefault("addresses", [])
+    sel_id = st.session_state.get("selected_addr_id")
+
+    if not addrs or not sel_id:
+        return ["Please select or add a delivery address in the sidebar, then say 'checkout' again."]
+
+    address_snapshot = next((a for a in addrs if a["id"] == sel_id), None)
+    if not address_snapshot:
+        return ["Selected address not found. Please reselect or add a new one."]
+
+    item_count = sum(it["qty"] for it in cart)
+
+    if item_count == 0:
+        return ["Your cart is empty. Add items before checking out."]
+
+    # Recompute totals to ensure consistency
+    subtotal, discount, shipping, tax, total = compute_totals(cart, coupon, u_version)
+
+    order_id = f"ORD{len(orders)+1:03d}"
+    order = {
+        "order_id": order_id,
+        "items": cart,
+        "subtotal": subtotal,
+        "discount": discount,
+        "shipping": shipping,
+        "tax": tax,
+        "total": total,
+        "coupon": coupon,
+        "status": "Processing"
+    }
+    # One checkout event: appends the order, clears cart and coupon
+    try:
+        record_cart_event(st.session_state.username, "checkout", expected_version=u_version, order=order)
+    except VersionConflict:
+        return [CART_CHANGED_MSG]
+    st.session_state.cart_items = []
+
+    # Confirmation in chat
+    short_addr = f"{address_snapshot.get('label','')}: {address_snapshot.get('line1','')}, {address_snapshot.get('city','')} {address_snapshot.get('postcode','')}"
+    return [
+        f"✅ Checkout successful! 🧾 {order_id} • {item_count} items • "
+        f"Subtotal ₹{subtotal} • Discount ₹{discount} • Shipping ₹{shipping} • "
+        f"Tax ₹{tax} • Total ₹{total} • Delivering to {short_addr}"
+    ]
+
+@fast_route(r"(?:show|view|see|open)\s+(?:my\s+)?(?:cart|basket)|(?:my\s+)?cart|what(?:'s|\s+is)\s+in\s+my\s+cart")
+def route_show_cart(m):
+    cart = load_cart(st.session_state.username)
+    if not cart:
+        return ["🛒 Your cart is empty."]
+    total = price_cart(cart.items()).subtotal
+    lines = "\n".join(f"• {it['name']} × {it['qty']} — ₹{it['price']}" for it in cart)
+    return [f"🛒 Your cart ({cart.quantity()} items):\n{lines}\n\nTotal: ₹{total}"]
+
+@fast_route(r"(?:remove|delete)\s+(?P<name>.+?)(?:\s+from\s+(?:my\s+)?(?:cart|basket))?")
+def route_remove_from_cart(m):
+    # Only unambiguous when the name is exactly a cart item; otherwise let the NLU try
+    name = m.group("name").strip()
+    cart = load_cart(st.session_state.username)
+    key = cart.find(name)
+    if key is None:
+        return None
+    record_cart_event(st.session_state.username, "cart_remove", key=key)
+    st.session_state.cart_items = load_cart(st.session_state.username).items()
+    return [f"🗑️ Removed {cart.lines[key]['name']} from your cart."]
+
+@fast_route(r"(?:track|where\s+is|status\s+of)\s+(?:my\s+)?(?:orders?\s+)?(?P<ids>ORD\d{3,}(?:\s*(?:,|and|&)?\s*ORD\d{3,})*)")
+def route_track_order(m):
+    ids = re.findall(r"ORD\d{3,}", m.group("ids").upper())
+    return "/track_order" + json.dumps({"order_id": " ".join(ids)})
+
 # 🔹 Chat input
 user_input = st.chat_input("Type your message:")
 
 if user_input:
     st.session_state.messages.append({"role": "user", "content": user_input})
+    # Show the user's turn right away; the history renderer only picks it up on the next rerun
+    st.chat_message("user").write(user_input)
     
-    # 2) INTERCEPT CHECKOUT HERE (add this block)
-    normalized = user_input.strip().lower()
-    if normalized in {"checkout", "check out", "proceed to checkout", "place order"}:
-        users = load_user_db()
-        u = users.setdefault(st.session_state.username, {})
-        cart = u.setdefault("cart", [])
-        orders = u.setdefault("orders", [])
-        coupon = u.get("coupon")
-        u.setdefault("cart", [])
-        u.setdefault("orders", [])
-        
-        # ADDRESS GUARD (same as sidebar)
-        addrs = u.setdefault("addresses", [])
-        sel_id = st.session_state.get("selected_addr_id")
-    
-        if not addrs or not sel_id:
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": "Please select or add a delivery address in the sidebar, then say 'checkout' again."
-            })
-            st.rerun()
-    
-        address_snapshot = next((a for a in addrs if a["id"] == sel_id), None)
-        if not address_snapshot:
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": "Selected address not found. Please reselect or add a new one."
-            })
-            st.rerun()
-
-        item_count = len(u["cart"])
-        #total = round(sum(float(it.get("price", 0.0) or 0.0) for it in u["cart"]), 2)
-
-        if item_count == 0:
-            st.session_state.messages.append({"role": "assistant", "content": "Your cart is empty. Add items before checking out."})
-            st.rerun()
-
-        # Recompute totals to ensure consistency
-        subtotal, discount, shipping, tax, total = compute_totals(cart, coupon)
-
-        order_id = f"ORD{len(orders)+1:03d}"
-        orders.append({
-            "order_id": order_id,
-            "items": cart,
-            "subtotal": subtotal,
-            "discount": discount,
-            "shipping": shipping,
-            "tax": tax,
-            "total": total,
-            "coupon": coupon,
-            "status": "Processing"
-        })
-        u["cart"] = []
-        u.pop("coupon", None)
-        users[st.session_state.username] = u
-        save_user_db(users)
-        st.session_state.cart_items = []
-
-        # Confirmation in chat
-        short_addr = f"{address_snapshot.get('label','')}: {address_snapshot.get('line1','')}, {address_snapshot.get('city','')} {address_snapshot.get('postcode','')}"
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": (
-                f"✅ Checkout successful! 🧾 {order_id} • {item_count} items • "
-                f"Subtotal ₹{subtotal} • Discount ₹{discount} • Shipping ₹{shipping} • "
-                f"Tax ₹{tax} • Total ₹{total} • Delivering to {short_addr}"
-            )
-        })
+    # 2) FAST PATH: unambiguous commands skip the NLU round trip
+    routed = route_command(user_input)
+    if isinstance(routed, list):
+        for content in routed:
+            st.session_state.messages.append({"role": "assistant", "content": content})
         st.rerun()
 
+    # Start the bot call first so the bookkeeping below overlaps with it
+    rasa_future = submit_to_rasa(routed or user_input)
+    with st.chat_message("assistant"):
+        thinking = st.empty()
+
     # Track last search keyword for personalization
-    if any(word in user_input.lower() for word in ["show", "find", "search", "buy", "price", "for"]):
-        user_record = users_data.get(st.session_state.username, {})
-        user_record.setdefault("last_search", None)
-        user_record["last_search"] = user_input
-        users_data[st.session_state.username] = user_record
-        save_user_db(users_data)
+    if not routed and any(word in user_input.lower() for word in ["show", "find", "search", "buy", "price", "for"]):
+        save_user(st.session_state.username, last_search=user_input)
 
     try:
-        bot_responses = send_message_to_rasa(user_input)
+        bot_responses = collect_rasa(rasa_future, thinking)
         st.session_state.last_products = []
 
         # Reset products for new search
         st.session_state.all_products = []
         st.session_state.show_limit = 5
+        st.session_state.search_cursor = None
 
         for resp in bot_responses:
             # Store raw response for debugging
@@ -378,13 +581,16 @@ if user_input:
             # Handle JSON product results from Rasa action
             if isinstance(resp.get("custom"), dict) and "product_results" in resp["custom"]:
                 st.session_state.all_products = resp["custom"]["product_results"]
+                st.session_state.search_cursor = resp["custom"].get("next_cursor")
                 st.session_state["last_event"] = "search"
                 # Extract product info for later reference
                 for product in st.session_state.all_products:
                     product_name = product.get("product_name", "")
                     price = float(product.get("price", 0) or 0)
                     if product_name:
-                        st.session_state.last_products.append({"name": product_name, "price": price})
+                        st.session_state.last_products.append(
+                            {"name": product_name, "price": price, "sku": product.get("sku")}
+                        )
             
             # Handle text responses
             if "text" in resp:
@@ -395,6 +601,13 @@ if user_input:
                 #if "You might also like these top-rated {category} products:" in text.lower():
                  #   st.session_state["last_recommendation_text"] = text
 
+            # Handle bulk order tracking (rendered as a table in the history)
+            if isinstance(resp.get("custom"), dict) and "order_tracking" in resp["custom"]:
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": {"order_tracking": resp["custom"]["order_tracking"]}
+                })
+
             # Handle recommendations
             recs = None
             if isinstance(resp.get("custom"), dict) and "recommendations" in resp["custom"]:
@@ -460,9 +673,9 @@ if user_input:
         unique = []
         seen = set()
         for p in st.session_state.last_products:
-            name = p.get("name")
-            if name and name not in seen:
-                seen.add(name)
+            ident = p.get("sku") or p.get("name")
+            if ident and ident not in seen:
+                seen.add(ident)
                 unique.append(p)
         st.session_state.last_products = unique
 
@@ -483,6 +696,7 @@ def render_products(products, limit):
     for product in products[:limit]:
         product_name = product.get("product_name", "")
         price = float(product.get("price", 0) or 0)
+        sku = product.get("sku")
         rating = product.get("rating", "—")
         category = product.get("category", "—")
         stock_status = product.get("stock_status", "—")
@@ -507,19 +721,12 @@ def render_products(products, limit):
                 add_key = f"add_{product_name.replace(' ', '_').lower()}_{shown}"
                 if st.button("🛒 Add", key=add_key):
                     # 1) Send to Rasa and CAPTURE the response for recommendation rendering
-                    bot_responses = send_message_to_rasa(f"add {product_name} to cart")
-                    st.session_state["pending_bot_responses"] = bot_responses  # <-- critical
+                    rasa_future = submit_to_rasa(add_to_cart_message(product_name, sku))
                     st.session_state["suppress_products_once"] = True
                     
-                    # Update user cart locally
-                    users = load_user_db()
-                    u = users.setdefault(st.session_state.username, {})
-                    u.setdefault("cart", [])
-                    u["cart"].append({"name": product_name, "price": price})
-                    users[st.session_state.username] = u
-                    save_user_db(users)
-                    
-                    st.session_state.cart_items = users[st.session_state.username].get("cart", [])
+                    # Update user cart locally (while Rasa works)
+                    add_to_cart(st.session_state.username, product_name, price, sku=sku)
+                    st.session_state["pending_bot_responses"] = collect_rasa(rasa_future)  # <-- critical
                     
                     st.success(f"✅ Added {product_name} to your cart.")
                     st.session_state["refresh_cart"] = True
@@ -542,9 +749,13 @@ if st.session_state.get("last_event") != "search":
 if should_show_products:
     st.markdown("### 🛍️ Products Found:")
     total_shown = render_products(st.session_state.all_products, st.session_state.show_limit)
-    if len(st.session_state.all_products) > st.session_state.show_limit:
+    has_more = len(st.session_state.all_products) > st.session_state.show_limit or st.session_state.search_cursor
+    if has_more:
         if st.button("🔽 Show More Products"):
             st.session_state.show_limit += 5
+            # Pull the next page from the backend once the local one is used up
+            if st.session_state.show_limit > len(st.session_state.all_products):
+                fetch_next_products_page()
             st.rerun()
             
 if st.session_state.get("last_event") == "add_to_cart":
@@ -556,14 +767,16 @@ if st.session_state.get("last_event") == "add_to_cart":
 with st.sidebar:
     st.header(f"🛒 {st.session_state.username}'s Cart")
 
-    users = load_user_db()
-    user_rec = users.get(st.session_state.username, {})
-    parsed_items = user_rec.get("cart", [])
-    st.session_state.cart_items = parsed_items[:] # keep session in sync with persisted store.
-    total_items = len(parsed_items)
-    total_price = round(sum(float(it.get("price", 0.0) or 0.0) for it in parsed_items), 2)
+    user_rec, user_version = load_user_version(st.session_state.username)
+    user_cart = Cart.from_payload(user_rec.get("cart"))
+    parsed_items = user_cart.items()
+    st.session_state.cart_items = parsed_items # keep session in sync with persisted store.
+    total_items = user_cart.quantity()
+    coupon = user_rec.get("coupon") or {}
+    # Totals (priced once per cart version)
+    subtotal, discount, shipping, tax, grand = compute_totals(parsed_items, coupon, user_version)
 
-    st.subheader(f"{total_items} items - ₹{total_price}")
+    st.subheader(f"{total_items} items - ₹{subtotal}")
 
     if not parsed_items:
         st.info("Your cart is empty.")
@@ -571,74 +784,36 @@ with st.sidebar:
         for idx, item in enumerate(parsed_items):
             cols = st.columns([4, 1])
             with cols[0]:
-                st.markdown(f"**{item['name']}** — ₹{item['price']}")
+                st.markdown(f"**{item['name']}** × {item['qty']} — ₹{item['price']}")
             with cols[1]:
-                if st.button("🗑️", key=f"remove_{idx}_{item['name']}"):
-                    # remove locally and persist
-                    users = load_user_db()
-                    u = users.setdefault(st.session_state.username, {})
-                    u.setdefault("cart", [])
-                    # remove first matching entry
-                    for j, it in enumerate(u["cart"]):
-                        if it["name"].lower() == item["name"].lower():
-                            u["cart"].pop(j)
-                            break
-                    users[st.session_state.username] = u
-                    save_user_db(users)
-                    st.session_state.cart_items = users[st.session_state.username].get("cart", [])
+                if st.button("🗑️", key=f"remove_{item['key']}"):
+                    # journal the removal of one unit (keyed, O(1)) and mirror it locally
+                    record_cart_event(st.session_state.username, "cart_remove", key=item["key"])
+                    st.session_state.cart_items = load_cart(st.session_state.username).items()
                     st.success(f"Removed {item['name']}")
                     st.rerun()
     st.divider()                
     #---Coupon Code------
-    # Coupon read
-    coupon = user_rec.get("coupon") or {}
-    
-    def apply_coupon(subtotal, c):
-        if not c: return 0.0
-        t, v = c.get("type"), float(c.get("value", 0))
-        if t == "percent": return round(subtotal * v / 100.0, 2)
-        if t == "flat": return round(min(v, subtotal), 2)
-        return 0.0
-    
-    # Totals
-    subtotal = round(sum(float(it.get("price", 0.0)) * int(it.get("qty", 1)) for it in parsed_items), 2)
-    discount = apply_coupon(subtotal, coupon)
-    tax_base = max(0.0, subtotal - discount)
-    shipping = 0.0 if tax_base >= 999 else 49.0
-    tax_rate = 0.18
-    tax = round(tax_base * tax_rate, 2)
-    grand = round(tax_base + shipping + tax, 2)
-    
     st.markdown(f"Subtotal: ₹{subtotal}")
     if discount > 0:
         st.markdown(f"Discount: -₹{discount} ({coupon.get('code','')})")
     st.markdown(f"Shipping: ₹{shipping}")
-    st.markdown(f"Tax (18%): ₹{tax}")
+    st.markdown(f"Tax ({float(pricing.RULES.tax_rate) * 100:g}%): ₹{tax}")
     st.subheader(f"Total: ₹{grand}")
     
     # Coupon UI
     with st.expander("Have a coupon?"):
         code = st.text_input("Enter code")
         if st.button("Apply"):
-            valid = {"SAVE10": {"type": "percent", "value": 10},
-                     "LESS50": {"type": "flat", "value": 50},
-                     "FREE": {"type": "flat", "value": 100}}
-            if code in valid:
-                users = load_user_db()
-                u = users.setdefault(st.session_state.username, {})
-                u["coupon"] = {"code": code, **valid[code]}
-                users[st.session_state.username] = u
-                save_user_db(users)
+            rule = get_coupon(code)
+            if rule:
+                record_cart_event(st.session_state.username, "coupon_apply", coupon=rule.to_dict())
                 st.success("Coupon applied!")
                 st.rerun()
             else:
                 st.warning("Invalid coupon.")
         if coupon and st.button("Remove coupon"):
-            users = load_user_db()
-            u = users.setdefault(st.session_state.username, {})
-            u.pop("coupon", None)
-            users[st.session_state.username] = u
-            save_user_db(users)
+            record_cart_event(st.session_state.username, "coupon_remove")
             st.info("Coupon removed.")
             st.rerun()  
             
@@ -677,13 +852,13 @@ with st.sidebar:
         
             # 2) Set Default
             if not is_def and st.button("Set Default", key=f"addr_def_{aid}"):
-                users = load_user_db()
-                u = users.setdefault(st.session_state.username, {})
-                addrs = u.setdefault("addresses", [])
-                for ax in addrs:
-                    ax["is_default"] = (ax["id"] == aid)
-                users[st.session_state.username] = u
-                save_user_db(users)
+                def set_default(u, aid=aid):
+                    addrs = u.get("addresses", [])
+                    for ax in addrs:
+                        ax["is_default"] = (ax["id"] == aid)
+                    return {"addresses": addrs}
+                USER_STORE.update_user(st.session_state.username, set_default)
+                invalidate_user(st.session_state.username)
                 st.session_state.selected_addr_id = aid
                 st.rerun()
         
@@ -692,13 +867,11 @@ with st.sidebar:
             # 3) Delete
             can_delete = len(addresses) > 1
             if st.button("Delete", key=f"addr_del_{aid}", disabled=not can_delete):
-                users = load_user_db()
-                u = users.setdefault(st.session_state.username, {})
-                addrs = u.setdefault("addresses", [])
-                addrs = [ax for ax in addrs if ax["id"] != aid]
-                u["addresses"] = addrs
-                users[st.session_state.username] = u
-                save_user_db(users)
+                def drop_address(u, aid=aid):
+                    return {"addresses": [ax for ax in u.get("addresses", []) if ax["id"] != aid]}
+                USER_STORE.update_user(st.session_state.username, drop_address)
+                invalidate_user(st.session_state.username)
+                addrs = load_user(st.session_state.username).get("addresses", [])
                 # reselection
                 if st.session_state.get("selected_addr_id") == aid:
                     st.session_state.selected_addr_id = addrs[0]["id"] if addrs else None
@@ -720,26 +893,25 @@ with st.sidebar:
             make_default = st.checkbox("Set as default", value=True)
             submitted = st.form_submit_button("Save address")
             if submitted:
-                users = load_user_db()
-                u = users.setdefault(st.session_state.username, {})
-                addrs = u.setdefault("addresses", [])
-                new_id = f"ADDR{len(addrs)+1:03d}"
-    
-                if make_default:
-                    for ax in addrs: ax["is_default"] = False
-    
-                addrs.append({
-                    "id": new_id, "label": label, "name": name,
-                    "line1": line1, "line2": line2, "city": city, "state": state,
-                    "postcode": postcode, "country": country, "phone": phone,
-                    "is_default": make_default
-                })
-                u["addresses"] = addrs
-                users[st.session_state.username] = u
-                save_user_db(users)
-    
-                # Select the new/updated address
-                st.session_state.selected_addr_id = new_id
+                def add_address(u):
+                    addrs = u.get("addresses", [])
+                    new_id = f"ADDR{len(addrs)+1:03d}"
+        
+                    if make_default:
+                        for ax in addrs: ax["is_default"] = False
+        
+                    addrs.append({
+                        "id": new_id, "label": label, "name": name,
+                        "line1": line1, "line2": line2, "city": city, "state": state,
+                        "postcode": postcode, "country": country, "phone": phone,
+                        "is_default": make_default
+                    })
+                    # Select the new/updated address
+                    st.session_state.selected_addr_id = new_id
+                    return {"addresses": addrs}
+                # Re-runs on a fresh read if another session changed this user meanwhile
+                USER_STORE.update_user(st.session_state.username, add_address)
+                invalidate_user(st.session_state.username)
                 st.success("Address saved.")
                 st.rerun()
     #----Checkout page----------
@@ -747,9 +919,8 @@ with st.sidebar:
 
     if total_items > 0:
         if st.button("💳 Checkout"):
-            users = load_user_db()
-            u = users.setdefault(st.session_state.username, {})
-            cart = u.setdefault("cart", [])
+            u, u_version = load_user_version(st.session_state.username)
+            cart = Cart.from_payload(u.get("cart")).items()
             orders = u.setdefault("orders", [])
             coupon = u.get("coupon")
     
@@ -783,27 +954,14 @@ with st.sidebar:
                 })
                 st.rerun()
     
-            # 3) TOTALS (same logic as sidebar display)
-            subtotal = round(sum(float(it["price"]) * int(it.get("qty",1)) for it in cart), 2)
-    
-            def apply_coupon(subtotal, c):
-                if not c: return 0.0
-                t, v = c.get("type"), float(c.get("value", 0))
-                if t == "percent": return round(subtotal * v / 100.0, 2)
-                if t == "flat": return round(min(v, subtotal), 2)
-                return 0.0
-    
-            discount = apply_coupon(subtotal, coupon)
-            tax_base = max(0.0, subtotal - discount)
-            shipping = 0.0 if tax_base >= 999 else 49.0
-            tax = round(tax_base * 0.18, 2)
-            total = round(tax_base + shipping + tax, 2)
+            # 3) TOTALS (same quote as the sidebar display)
+            subtotal, discount, shipping, tax, total = compute_totals(cart, coupon, u_version)
     
             order_id = f"ORD{len(orders)+1:03d}"
             item_count = sum(int(i.get("qty",1)) for i in cart)
     
             # 4) SAVE ORDER with address snapshot
-            orders.append({
+            order = {
                 "order_id": order_id,
                 "items": cart,
                 "subtotal": subtotal,
@@ -814,13 +972,15 @@ with st.sidebar:
                 "coupon": coupon,
                 "status": "Processing",
                 "ship_to": address_snapshot
-            })
+            }
     
-            # 5) CLEAR CART & COUPON
-            u["cart"] = []
-            u.pop("coupon", None)
-            users[st.session_state.username] = u
-            save_user_db(users)
+            # 5) CLEAR CART & COUPON (same checkout event)
+            try:
+                record_cart_event(st.session_state.username, "checkout", expected_version=u_version, order=order)
+            except VersionConflict:
+                st.warning(CART_CHANGED_MSG)
+                st.session_state.messages.append({"role": "assistant", "content": CART_CHANGED_MSG})
+                st.rerun()
     
             # 6) CHAT CONFIRMATION + RERUN
             short_addr = f"{address_snapshot.get('label','')}: {address_snapshot.get('line1','')}, {address_snapshot.get('city','')} {address_snapshot.get('postcode','')}"
@@ -841,17 +1001,19 @@ with st.sidebar:
     st.subheader("📦 Order History")
 
     if st.button("🧾 View My Orders"):
-        users = load_user_db()
-        orders = users.get(st.session_state.username, {}).get("orders", [])
+        orders = load_user(st.session_state.username).get("orders", [])
         if not orders:
             st.info("You haven't placed any orders yet.")
         else:
             for order in reversed(orders):
                 with st.expander(f"🆔 {order['order_id']} — ₹{order['total']}"):
                     for it in order["items"]:
-                        st.markdown(f"- **{it['name']}** — ₹{it['price']}")
+                        qty = f" × {it['qty']}" if int(it.get("qty", 1)) > 1 else ""
+                        st.markdown(f"- **{it['name']}**{qty} — ₹{it['price']}")
 
     st.divider()
+    if st.session_state.get("rasa_latency_ms") is not None:
+        st.caption(f"⚡ Last bot reply: {st.session_state.rasa_latency_ms} ms")
     if st.button("🚪 Logout"):
         st.session_state.authenticated = False
         st.session_state.username = None
@@ -859,6 +1021,7 @@ with st.sidebar:
         st.session_state.last_products = []
         st.session_state.all_products = []
         st.session_state.show_limit = 5
+        st.session_state.search_cursor = None
         st.success("Logged out successfully.")
         st.rerun()
 
@@ -882,25 +1045,19 @@ if st.session_state.last_products:
     for i, item in enumerate(st.session_state.last_products[:4]):  # Show only first 4
         product = item["name"]
         price = item.get("price", 0.0)
+        sku = item.get("sku")
         with cols[i]:
             key = f"add_quick_{i}_{product}"
             if st.button(f"Add {product} 🛒", key=key):
                 st.toast(f"🛒 Adding {product}...", icon="🛍️")
 
                 # 1) Call Rasa to keep backend slot in sync
-                bot_responses = send_message_to_rasa(f"add {product} to cart")
-                st.session_state["pending_bot_responses"] = bot_responses
-
-                # 2) Update persistent users_data immediately (source-of-truth for UI)
-                users = load_user_db()
-                u = users.setdefault(st.session_state.username, {})
-                u.setdefault("cart", [])
-                u["cart"].append({"name": product, "price": price})
-                users[st.session_state.username] = u
-                save_user_db(users)
-
-                # 3) update local session for instant sidebar display
-                st.session_state.cart_items = u["cart"]
+                rasa_future = submit_to_rasa(add_to_cart_message(product, sku))
+
+                # 2) Update persistent users_data immediately (source-of-truth for UI), overlapping the Rasa call
+                # 3) ...which also refreshes the session cart for instant sidebar display
+                add_to_cart(st.session_state.username, product, price, sku=sku)
+                st.session_state["pending_bot_responses"] = collect_rasa(rasa_future)
 
                 st.success(f"✅ {product} added to cart!")
                 st.session_state["refresh_cart"] = True
@@ -0,0 +1,41 @@
+"""
+Per-call latency of custom actions run in-process (no Rasa or action server),
+through the same runner the app's embedded mode uses.
+
+Run from the directory holding products.csv / orders.csv:
+    python /path/to/benchmarks/bench_actions.py [repeat]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rasa"))
+from actions.embedded import EmbeddedActions  # noqa: E402
+
+CASES = [
+    ("action_search_products", "show me phones under 40000", None),
+    ("action_check_stock", "is smartphone in stock", None),
+    ("action_add_to_cart", "add smartphone to cart", None),
+    ("action_track_order", "/track_order" + json.dumps({"order_id": "ORD001"}), {"order_id": "ORD001"}),
+]
+
+
+def main(repeat: int):
+    runner = EmbeddedActions()
+    print(f"{'action':<26} | {'p50 ms':>8} | {'p95 ms':>8}")
+    for action_name, text, entities in CASES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            runner.run_action(action_name, "bench", text, entities)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{action_name:<26} | {statistics.median(timings):>8.2f} | {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
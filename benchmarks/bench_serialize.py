@@ -0,0 +1,69 @@
+"""
+Rows/sec of the search-result payload builder: the old per-row iterrows loop
+vs. the columnar serializer in rasa/actions/serializers.py.
+
+Run from the repo root:
+    python benchmarks/bench_serialize.py [rows ...]
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rasa"))
+from actions.serializers import dumps_json, product_results_payload  # noqa: E402
+
+
+def make_products(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "product_name": [f"Product {i}" for i in range(n)],
+        "price": rng.uniform(10, 60000, n).round(2),
+        "category": rng.choice(["electronics", "clothing", "books", "shoes"], n),
+        "rating": rng.uniform(1, 5, n).round(1),
+        "stock_status": rng.choice(["In Stock", "Out of Stock", "Limited"], n),
+        "delivery_time": rng.choice(["3-5 days", "2 days", "5 business days"], n),
+    })
+
+
+def iterrows_payload(df: pd.DataFrame):
+    """The loop ActionSearchProduct used before the serializer."""
+    product_list = []
+    for _, row in df.iterrows():
+        product_list.append({
+            "product_name": row["product_name"],
+            "price": row["price"],
+            "category": row["category"],
+            "rating": row["rating"],
+            "stock_status": row["stock_status"],
+            "delivery_time": row["delivery_time"]
+        })
+    return product_list
+
+
+def rows_per_sec(fn, df: pd.DataFrame, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - start)
+    return len(df) / best
+
+
+def main(sizes):
+    print(f"{'rows':>8} | {'iterrows':>12} | {'columnar':>12} | {'+json':>12} | {'+fast json':>12}")
+    for n in sizes:
+        df = make_products(n)
+        before = rows_per_sec(iterrows_payload, df)
+        after = rows_per_sec(product_results_payload, df)
+        with_json = rows_per_sec(lambda d: json.dumps(product_results_payload(d)), df)
+        with_fast = rows_per_sec(lambda d: dumps_json(product_results_payload(d)), df)
+        print(f"{n:>8} | {before:>12,.0f} | {after:>12,.0f} | {with_json:>12,.0f} | {with_fast:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
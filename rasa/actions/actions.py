@@ -6,31 +6,444 @@
 
 import random
 import datetime
+from collections import Counter
 from typing import Any, Text, Dict, List
 import pandas as pd
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
-from fuzzywuzzy import process
+from actions.serializers import (
+    dumps_json,
+    product_results_payload,
+    recommendations_payload,
+)
+from actions.catalog_snapshot import assign_skus, catalog_signature, load_products
+from actions.user_store import DEFAULT_STORE_PATH, open_user_store
+from actions.pricing import price_cart
+from actions.cart import Cart
+from rapidfuzz import fuzz, process, utils
+import numpy as np
 import re
 import json
 import os
+import base64
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timedelta
 
-# Load products dataset once (for performance)
-PRODUCTS_DF = pd.read_csv("products.csv")
+# Load products dataset once (for performance); a memory-mapped Arrow snapshot
+# is used when present, and the catalog hot-reloads when either file changes
+PRODUCTS_PATH = os.environ.get("PRODUCTS_PATH", "products.csv")
+CATALOG_RELOAD_INTERVAL = float(os.environ.get("CATALOG_RELOAD_INTERVAL", "30"))
+PRODUCTS_DF = load_products(PRODUCTS_PATH)
 
 ORDERS_DF = pd.read_csv("orders.csv")
 
-USERS_FILE = "users_data.json"
+USERS_FILE = "users_data.json"  # legacy JSON, imported into the user store on first start
+USERS = open_user_store(DEFAULT_STORE_PATH, legacy_json=USERS_FILE)
 
 #print(f"✅ Loaded {len(PRODUCTS_DF)} products from CSV.")
 #print(f"Sample categories: {PRODUCTS_DF['category'].unique()[:5]}")
 
+# Fuzzy thresholds (0-100) and scorer threads (-1 = all cores)
+CATEGORY_MATCH_SCORE = 70
+PRODUCT_MATCH_SCORE = 60
+RELATED_MATCH_SCORE = 55
+ADD_TO_CART_MATCH_SCORE = 70
+FUZZY_WORKERS = int(os.environ.get("FUZZY_WORKERS", "-1"))
+
+# Products per search page (0 = send every match in one message, the old behaviour)
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", "20"))
+
 # ✅ Load synonyms from external file
 with open("synonyms.json", "r", encoding="utf-8") as f:
     SYNONYMS = json.load(f)
 
+
+def _trie_pattern(words: List[str]) -> str:
+    """Regex body matching any of `words`, with shared prefixes factored into a trie."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A word ending here makes the rest optional; greedy, so the longest synonym wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class SynonymRewriter:
+    """
+    synonyms.json compiled into one word-bounded regex. `rewrite` replaces every
+    synonym with its category in a single left-to-right pass, so "coat" inside
+    "raincoat" is never touched and no replacement is rewritten again.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]]):
+        self.lookup = {
+            syn.lower().strip(): category
+            for category, syns in synonyms.items()
+            for syn in syns
+            if syn.strip()
+        }
+        self.pattern = re.compile(r"\b" + _trie_pattern(list(self.lookup)) + r"\b") if self.lookup else None
+
+    def rewrite(self, text: str):
+        """Return (rewritten_text, categories hit in order of appearance)."""
+        hits: List[str] = []
+        if self.pattern is None:
+            return text, hits
+
+        def _replace(m):
+            category = self.lookup[m.group(0)]
+            if category not in hits:
+                hits.append(category)
+            return category
+
+        return self.pattern.sub(_replace, text), hits
+
+
+SYNONYM_REWRITER = SynonymRewriter(SYNONYMS)
+
+
+def _normalize_text(series: pd.Series) -> pd.Series:
+    return series.astype(str).str.lower().str.strip()
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+def _trigrams(token: str) -> List[str]:
+    return [token[i:i + 3] for i in range(len(token) - 2)]
+
+
+def fuzzy_scores(queries: List[str], choices: List[str], score_cutoff: float = 0) -> np.ndarray:
+    """
+    Score every query against every choice in one batched rapidfuzz pass
+    (WRatio, same scale as fuzzywuzzy). Scores below `score_cutoff` are 0.
+    Returns a len(queries) x len(choices) array.
+    """
+    if not queries or not choices:
+        return np.zeros((len(queries), len(choices)))
+    return process.cdist(
+        queries, choices,
+        scorer=fuzz.WRatio,
+        processor=utils.default_process,
+        score_cutoff=score_cutoff,
+        workers=FUZZY_WORKERS,
+    )
+
+def best_fuzzy_match(choices: List[str], scores: np.ndarray):
+    """(choice, score) with the highest score, or (None, 0) if nothing scored."""
+    if len(choices) == 0:
+        return None, 0
+    i = int(np.argmax(scores))
+    if scores[i] <= 0:
+        # cdist zeroes everything under the cutoff; argmax of all zeros is just choices[0]
+        return None, 0
+    return choices[i], float(scores[i])
+
+
+_PRICE_NUM = r"(?:rs\.?|inr|₹)?\s*(\d+(?:\.\d+)?)\s*(k)?\b"
+_PRICE_BETWEEN_RE = re.compile(r"\b(?:between|from)\s+" + _PRICE_NUM + r"\s*(?:and|to|-)\s*" + _PRICE_NUM)
+_PRICE_MAX_RE = re.compile(r"\b(?:under|below|less than|upto|up to|within)\s+" + _PRICE_NUM)
+_PRICE_MIN_RE = re.compile(r"\b(?:over|above|more than|from)\s+" + _PRICE_NUM)
+
+def _price_value(number: str, k_suffix: str | None) -> float:
+    return float(number) * (1000 if k_suffix else 1)
+
+def _parse_price_bounds(text: str):
+    """
+    Extract (price_min, price_max) from a message. Supports "under 2000",
+    "above 500", "between 1k and 2k" / "from 1000 to 2000". Missing bounds are None.
+    """
+    t = (text or "").lower()
+    m = _PRICE_BETWEEN_RE.search(t)
+    if m:
+        lo, hi = _price_value(*m.group(1, 2)), _price_value(*m.group(3, 4))
+        return min(lo, hi), max(lo, hi)
+    price_min, price_max = None, None
+    m = _PRICE_MAX_RE.search(t)
+    if m:
+        price_max = _price_value(*m.group(1, 2))
+    m = _PRICE_MIN_RE.search(t)
+    if m:
+        price_min = _price_value(*m.group(1, 2))
+    return price_min, price_max
+
+def _strip_price_phrases(text: str) -> str:
+    """Drop the price clauses so they don't dilute fuzzy matching of the product part."""
+    for pattern in (_PRICE_BETWEEN_RE, _PRICE_MAX_RE, _PRICE_MIN_RE):
+        text = pattern.sub(" ", text)
+    return " ".join(text.split()) or text
+
+def _filter_price(df: pd.DataFrame, price_min=None, price_max=None) -> pd.DataFrame:
+    if price_max is not None:
+        df = df[df['price'] <= price_max]
+    if price_min is not None:
+        df = df[df['price'] >= price_min]
+    return df
+
+
+class CatalogIndex:
+    """
+    Normalized views of the product catalog, built once at load so the actions
+    never re-lowercase whole columns per message.
+      - names / categories: normalized per-row Series aligned with `df`
+      - category_rows / name_rows: normalized value -> row positions
+      - token_postings / trigram_postings: inverted index over `name_list`
+        ids, used to shortlist names before any fuzzy scoring
+      - category_prices: category -> (ascending prices, row positions), so a
+        price range on one category is a binary-searched slice
+      - top_rated: category -> (names, payloads) of its best-rated distinct
+        products, enough to fill a recommendation row after excluding one
+      - skus / name_skus / sku_rows: per-row SKU, normalized name -> SKUs,
+        and SKU -> row position (what the app's Add buttons send)
+      - version: content fingerprint of the catalog, used to invalidate caches
+    """
+
+    # Trigrams shared by more names than this are too common to narrow anything down
+    MAX_TRIGRAM_POSTINGS = 5000
+    # Recommendations shown after an add, plus headroom for excluding the added item
+    RECOMMENDATION_COUNT = 3
+    TOP_RATED_PER_CATEGORY = RECOMMENDATION_COUNT + 2
+
+    def __init__(self, df: pd.DataFrame):
+        if "sku" not in df.columns:
+            df = assign_skus(df)
+        self.df = df.reset_index(drop=True)
+        self.version = format(int(pd.util.hash_pandas_object(self.df, index=False).sum()) & (2**64 - 1), "016x")
+        self.names = _normalize_text(self.df["product_name"])
+        self.skus = self.df["sku"].astype(str)
+        self.categories = _normalize_text(self.df["category"])
+        self.category_list = self.categories.unique().tolist()
+        self.name_list = self.names.unique().tolist()
+        self.category_rows = dict(self.categories.groupby(self.categories).indices)
+        self.name_rows = dict(self.names.groupby(self.names).indices)
+        sku_list = self.skus.tolist()
+        self.name_skus = {name: [sku_list[p] for p in positions] for name, positions in self.name_rows.items()}
+        self.sku_rows = {sku: pos for pos, sku in enumerate(sku_list)}
+
+        prices = pd.to_numeric(self.df["price"], errors="coerce").to_numpy(dtype=float)
+        self.category_prices: Dict[str, Any] = {}
+        for category, positions in self.category_rows.items():
+            positions = positions[~np.isnan(prices[positions])]
+            order = np.argsort(prices[positions], kind="stable")
+            self.category_prices[category] = (prices[positions][order], positions[order])
+
+        self.top_rated: Dict[str, Any] = {}
+        ranked = self.df
+        if "rating" in self.df.columns:
+            ranked = self.df.sort_values(by="rating", ascending=False, kind="mergesort")
+        ranked = ranked[~self.names.loc[ranked.index].duplicated()]
+        for category, top in ranked.groupby(self.categories.loc[ranked.index], sort=False):
+            top = top.head(self.TOP_RATED_PER_CATEGORY)
+            self.top_rated[category] = (self.names.loc[top.index].tolist(), recommendations_payload(top))
+
+        self.token_postings: Dict[str, List[int]] = {}
+        self.trigram_postings: Dict[str, List[int]] = {}
+        for name_id, name in enumerate(self.name_list):
+            tokens = set(_tokenize(name))
+            grams = {g for tok in tokens for g in _trigrams(tok)}
+            for tok in tokens:
+                self.token_postings.setdefault(tok, []).append(name_id)
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, []).append(name_id)
+
+    def rows(self, positions) -> pd.DataFrame:
+        return self.df.iloc[positions]
+
+    def by_category(self, category: str | None) -> pd.DataFrame:
+        key = (category or "").lower().strip()
+        return self.rows(self.category_rows.get(key, []))
+
+    def by_name(self, name: str | None) -> pd.DataFrame:
+        key = (name or "").lower().strip()
+        return self.rows(self.name_rows.get(key, []))
+
+    def by_sku(self, sku: str | None) -> pd.DataFrame:
+        pos = self.sku_rows.get(str(sku or "").strip())
+        return self.rows([] if pos is None else [pos])
+
+    def recommendations_for(self, category: str | None, exclude_name: str | None = None) -> List[Dict[str, Any]]:
+        """Top-rated products of `category` (payload dicts), skipping `exclude_name`."""
+        key = (category or "").lower().strip()
+        names, payloads = self.top_rated.get(key, ([], []))
+        recs = [p for n, p in zip(names, payloads) if n != exclude_name]
+        return recs[:self.RECOMMENDATION_COUNT]
+
+    def in_price_range(self, category: str | None, price_min=None, price_max=None) -> pd.DataFrame:
+        """Rows of `category` priced within [price_min, price_max] (either bound optional)."""
+        key = (category or "").lower().strip()
+        if key not in self.category_prices:
+            return self.rows([])
+        prices, positions = self.category_prices[key]
+        # searchsorted is numpy's bisect_left / bisect_right
+        lo = np.searchsorted(prices, price_min, side="left") if price_min is not None else 0
+        hi = np.searchsorted(prices, price_max, side="right") if price_max is not None else len(prices)
+        return self.rows(positions[lo:hi])
+
+    def name_contains(self, text: str) -> pd.DataFrame:
+        # Literal substring match: `text` is raw user input, not a pattern
+        return self.df[self.names.str.contains(text, na=False, regex=False)]
+
+    def rows_for_names(self, names) -> pd.DataFrame:
+        positions = [pos for n in names for pos in self.name_rows.get(n, [])]
+        return self.rows(sorted(positions))
+
+    def candidate_names(self, query: str, limit: int = 200) -> List[str]:
+        """
+        Shortlist normalized names sharing whole tokens (weighted) or trigrams
+        with the query, best overlap first. Fuzzy scoring then only runs on
+        this shortlist instead of the whole catalog.
+        """
+        hits: Counter = Counter()
+        for tok in set(_tokenize(query)):
+            for name_id in self.token_postings.get(tok, []):
+                hits[name_id] += 3
+            postings = [self.trigram_postings[g] for g in _trigrams(tok) if g in self.trigram_postings]
+            usable = [p for p in postings if len(p) <= self.MAX_TRIGRAM_POSTINGS]
+            if not usable and postings:
+                usable = [min(postings, key=len)]
+            for p in usable:
+                hits.update(p)
+        return [self.name_list[i] for i, _ in hits.most_common(limit)]
+
+    def names_containing(self, token: str) -> List[str]:
+        """Normalized names containing `token`, via trigram posting intersection."""
+        grams = _trigrams(token)
+        if not grams:
+            return [n for n in self.name_list if token in n]
+        postings = sorted((self.trigram_postings.get(g, []) for g in grams), key=len)
+        ids = set(postings[0])
+        for p in postings[1:]:
+            ids.intersection_update(p)
+            if not ids:
+                return []
+        return [self.name_list[i] for i in sorted(ids) if token in self.name_list[i]]
+
+    def names_matching_phrase(self, phrase: str) -> List[str]:
+        """Normalized names containing `phrase` literally (no regex), narrowed per token first."""
+        phrase = " ".join((phrase or "").lower().split())
+        if not phrase:
+            return []
+        if phrase in self.name_rows:
+            return [phrase]
+        tokens = [tok for tok in _tokenize(phrase) if len(tok) >= 3]
+        if not tokens:
+            return [n for n in self.name_list if phrase in n]
+        names = set(self.names_containing(tokens[0]))
+        for tok in tokens[1:]:
+            names.intersection_update(self.names_containing(tok))
+        return sorted(n for n in names if phrase in n)
+
+
+CATALOG = CatalogIndex(PRODUCTS_DF)
+
+
+class StockCounters:
+    """
+    Live per-SKU stock, seeded from the catalog's stock_qty and then changed
+    in memory (checkouts through action_checkout, or set_quantity/adjust
+    from code) without rewriting products.csv. SKUs with a unit count report
+    a status derived from it; the rest report the catalog's stock_status.
+    A catalog reload overwrites a SKU's count only when its stock_qty in the
+    file changed, so editing the CSV still restocks. Thread-safe.
+    """
+
+    LOW_STOCK = 5
+
+    def __init__(self, catalog: CatalogIndex):
+        self._lock = threading.Lock()
+        self._status: Dict[str, str] = {}
+        self._qty: Dict[str, int] = {}
+        self._catalog_qty: Dict[str, int] = {}  # stock_qty as of the last sync
+        self.sync_catalog(catalog)
+
+    def sync_catalog(self, catalog: CatalogIndex) -> None:
+        df = catalog.df
+        skus = catalog.skus.tolist()
+        statuses = df["stock_status"].astype(str).tolist() if "stock_status" in df.columns else ["Unknown"] * len(skus)
+        with self._lock:
+            self._status = dict(zip(skus, statuses))
+            if "stock_qty" in df.columns:
+                for sku, qty in zip(skus, pd.to_numeric(df["stock_qty"], errors="coerce").tolist()):
+                    if pd.isna(qty):
+                        continue
+                    if self._catalog_qty.get(sku) != int(qty):
+                        self._qty[sku] = self._catalog_qty[sku] = int(qty)
+
+    def set_quantity(self, sku: str, qty: int) -> None:
+        with self._lock:
+            self._qty[sku] = max(0, int(qty))
+
+    def adjust(self, sku: str, delta: int) -> int | None:
+        """Add `delta` units (negative for a sale). Returns the new count, or None if untracked."""
+        with self._lock:
+            if sku not in self._qty:
+                return None
+            self._qty[sku] = max(0, self._qty[sku] + int(delta))
+            return self._qty[sku]
+
+    def lookup(self, skus: List[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            out = []
+            for sku in skus:
+                qty = self._qty.get(sku)
+                if qty is None:
+                    status = self._status.get(sku, "Unknown")
+                elif qty <= 0:
+                    status = "Out of Stock"
+                elif qty <= self.LOW_STOCK:
+                    status = "Limited"
+                else:
+                    status = "In Stock"
+                out.append({"sku": sku, "stock_status": status, "quantity": qty})
+            return out
+
+
+STOCK = StockCounters(CATALOG)
+
+
+def _watch_catalog(interval: float) -> None:
+    """
+    Poll products.csv / its snapshot and swap in a freshly built CatalogIndex
+    when either changes. Indexes are built off the request path and published
+    with a single assignment; running requests keep the snapshot they started with.
+    """
+    global CATALOG
+    signature = catalog_signature(PRODUCTS_PATH)
+    while True:
+        time.sleep(interval)
+        if catalog_signature(PRODUCTS_PATH) == signature:
+            continue
+        try:
+            catalog = CatalogIndex(load_products(PRODUCTS_PATH))
+        except Exception as e:
+            # Probably caught a half-written file; retry on the next tick
+            print(f"⚠️ Catalog reload failed, keeping version {CATALOG.version}: {e}")
+            continue
+        signature = catalog_signature(PRODUCTS_PATH)
+        if catalog.version != CATALOG.version:
+            CATALOG = catalog
+            STOCK.sync_catalog(catalog)
+            print(f"🔄 Catalog reloaded: version {catalog.version}, {len(catalog.df)} products")
+
+
+if CATALOG_RELOAD_INTERVAL > 0:
+    threading.Thread(
+        target=_watch_catalog, args=(CATALOG_RELOAD_INTERVAL,), name="catalog-watcher", daemon=True
+    ).start()
+
 class ActionUserLogin(Action):
     def name(self) -> Text:
         return "action_user_login"
@@ -39,8 +452,6 @@ class ActionUserLogin(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        import json
-
         user_message = tracker.latest_message.get("text", "").strip()
         parts = user_message.split()
 
@@ -50,29 +461,248 @@ class ActionUserLogin(Action):
 
         _, username, password = parts[:3]
 
-        # Load existing users
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, "r", encoding="utf-8") as f:
-                users_data = json.load(f)
-        else:
-            users_data = {"users": {}}
-
         # If user exists, check password
-        if username in users_data["users"]:
-            if users_data["users"][username]["password"] == password:
+        if USERS.has_user(username):
+            if USERS.check_password(username, password):
                 dispatcher.utter_message(text=f"👋 Welcome back, {username}! Your previous data has been loaded.")
-                cart = users_data["users"][username].get("cart", [])
-                return [SlotSet("cart", cart)]
+                cart = USERS.get_field(username, "cart", [])
+                return [SlotSet("cart", Cart.from_payload(cart).to_payload())]
             else:
                 dispatcher.utter_message(text="❌ Incorrect password. Try again.")
                 return []
         else:
             # Register new user
-            users_data["users"][username] = {"password": password, "cart": []}
-            with open(USERS_FILE, "w", encoding="utf-8") as f:
-                json.dump(users_data, f, indent=4)
+            USERS.create_user(username, password)
             dispatcher.utter_message(text=f"✅ New user created! Welcome, {username}.")
-            return [SlotSet("cart", [])]
+            return [SlotSet("cart", {})]
+
+class QueryCache:
+    """
+    Bounded LRU cache with a TTL, tied to one catalog version: the first
+    lookup against a different version drops every entry, and entries are
+    stamped with their version so a request still running on the previous
+    catalog can never be served (or serve) the wrong rows. Thread-safe.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != version or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, version, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+SEARCH_CACHE = QueryCache(
+    maxsize=int(os.environ.get("SEARCH_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("SEARCH_CACHE_TTL", "600")),
+)
+# How often the action server logs the cache counters, for sizing it (0 = never)
+SEARCH_CACHE_STATS_INTERVAL = float(os.environ.get("SEARCH_CACHE_STATS_INTERVAL", "300"))
+
+
+def _log_cache_stats(cache: QueryCache, interval: float) -> None:
+    """Print the cache counters every `interval` seconds, skipping idle periods."""
+    last_lookups = 0
+    while True:
+        time.sleep(interval)
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        if lookups != last_lookups:
+            last_lookups = lookups
+            print(f"📊 Search cache: {stats}")
+
+
+if SEARCH_CACHE_STATS_INTERVAL > 0:
+    threading.Thread(
+        target=_log_cache_stats, args=(SEARCH_CACHE, SEARCH_CACHE_STATS_INTERVAL),
+        name="search-cache-stats", daemon=True,
+    ).start()
+
+
+def search_catalog(user_message: str, last_category: str | None, catalog: "CatalogIndex | None" = None):
+    """
+    Run the full search pipeline (synonyms, price bounds, fuzzy matching,
+    dedup) for one message. Returns (ranked_products, selected_category); the
+    ranking is best rating first, cheapest first, before any shuffling.
+    Ranked results are cached per normalized query, category and price bounds.
+    Pass the request's `catalog` snapshot so a hot reload mid-request can't mix versions.
+    """
+    catalog = catalog or CATALOG
+    user_message = (user_message or "").lower().strip()
+
+    is_price_only = any(kw in user_message for kw in ["under", "below", "over", "above", "between"]) and \
+            not any(kw in user_message for kw in ["show", "find", "search", "buy", "phone", "book", "coat", "laptop"])
+
+    # 🔹 Synonym replacement (single pass, word-bounded)
+    user_message, synonym_categories = SYNONYM_REWRITER.rewrite(user_message)
+    # A message that names a category ("sneakers above 1000") is a new search, not a follow-up
+    if is_price_only and (synonym_categories or any(
+        re.search(rf"\b{re.escape(c)}\b", user_message) for c in catalog.category_list
+    )):
+        is_price_only = False
+    price_min, price_max = _parse_price_bounds(user_message)
+    if price_min is not None or price_max is not None:
+        user_message = _strip_price_phrases(user_message)
+
+    last_category = (last_category or "").lower().strip() or None
+    key = (user_message, tuple(synonym_categories), is_price_only, last_category, price_min, price_max)
+    cached = SEARCH_CACHE.get(key, catalog.version)
+    if cached is not None:
+        positions, selected_category = cached
+        return catalog.rows(positions), selected_category
+
+    ranked, selected_category = _rank_matches(
+        catalog, user_message, synonym_categories, is_price_only, last_category, price_min, price_max
+    )
+    SEARCH_CACHE.put(key, catalog.version, (ranked.index.to_numpy(), selected_category))
+    return ranked, selected_category
+
+
+def _rank_matches(catalog, user_message, synonym_categories, is_price_only, last_category, price_min, price_max):
+    if is_price_only and last_category:
+        # Follow-up like "under 2000": slice the remembered category's price index
+        selected_category = last_category
+        matched_products = catalog.in_price_range(last_category, price_min, price_max)
+    else:
+        # Match category using fuzzy logic
+        # One batched pass scores categories and shortlisted names together
+        categories = catalog.category_list
+        name_candidates = catalog.candidate_names(user_message)
+        scores = fuzzy_scores([user_message], categories + name_candidates, RELATED_MATCH_SCORE)[0]
+        cat_scores, name_scores = scores[:len(categories)], scores[len(categories):]
+        matched_category, score = best_fuzzy_match(categories, cat_scores)
+        matched_prod, prod_score = best_fuzzy_match(name_candidates, name_scores)
+
+        if score >= CATEGORY_MATCH_SCORE:
+            selected_category = matched_category
+            matched_products = catalog.in_price_range(matched_category, price_min, price_max)
+
+        elif prod_score >= PRODUCT_MATCH_SCORE:
+            q = user_message.lower()
+            q_tokens = set(_tokenize(q))
+
+            contains_set = {n for tok in q_tokens if len(tok) >= 4 for n in catalog.names_containing(tok)}
+            if "coat" in q:
+                contains_set.update(catalog.names_containing("coat"))
+
+            related_cutoff = max(RELATED_MATCH_SCORE, prod_score - 15)
+            top = np.argsort(-name_scores, kind="stable")[:120]
+            fuzzy_set = {name_candidates[i] for i in top if name_scores[i] >= related_cutoff}
+
+            matched_products = catalog.rows_for_names(contains_set | fuzzy_set)
+            matched_products = _filter_price(matched_products, price_min, price_max)
+            selected_category = last_category
+
+        else:
+            selected_category = last_category  # fallback to memory
+            matched_products = catalog.name_contains(user_message)
+            matched_products = _filter_price(matched_products, price_min, price_max)
+
+    # ✅ Synonym fallback (only if nothing matched yet)
+    if matched_products.empty:
+        if synonym_categories:
+            matched_products = catalog.by_category(synonym_categories[0])
+
+    if matched_products.empty:
+        return matched_products, selected_category
+
+    # --- DEDUP by normalized name to avoid repeated same product label with variants
+    tmp = matched_products.copy()
+    tmp["__name_norm__"] = catalog.names.loc[tmp.index]
+    if "rating" in tmp.columns and "price" in tmp.columns:
+        tmp = tmp.sort_values(by=["rating", "price"], ascending=[False, True])
+    ranked = tmp.drop_duplicates(subset="__name_norm__", keep="first")
+    return ranked.drop(columns="__name_norm__"), selected_category
+
+
+def _encode_search_cursor(state: Dict[str, Any]) -> str:
+    raw = dumps_json(state).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _is_count(value: Any, limit: int | None = None) -> bool:
+    # A plain non-negative int (bool is an int subclass but never a valid count)
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0 and (limit is None or value < limit)
+
+def _decode_search_cursor(cursor: str | None):
+    """
+    The search state in a cursor, or None if it is missing or malformed. The
+    cursor comes back from the client, so every field is checked.
+    """
+    if not cursor or not isinstance(cursor, str):
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        return None
+    if not isinstance(state, dict) or not isinstance(state.get("q"), str):
+        return None
+    if state.get("c") is not None and not isinstance(state["c"], str):
+        return None
+    if not _is_count(state.get("s"), 2**32) or not _is_count(state.get("o", 0)):
+        return None
+    return state
+
+def _search_page(ranked: pd.DataFrame, state: Dict[str, Any]):
+    """
+    Slice one page of the shuffled results. The shuffle seed travels in the
+    cursor, so every page of the same search sees the same order.
+    Returns (page_products, next_cursor or None).
+    """
+    offset = int(state.get("o", 0))
+    shuffled = ranked.sample(frac=1, random_state=state["s"])
+    page = shuffled.iloc[offset:offset + SEARCH_PAGE_SIZE]
+    next_cursor = None
+    if offset + SEARCH_PAGE_SIZE < len(shuffled):
+        next_cursor = _encode_search_cursor({**state, "o": offset + SEARCH_PAGE_SIZE})
+    return page, next_cursor
 
 class ActionSearchProduct(Action):
     def name(self) -> str:
@@ -83,9 +713,6 @@ class ActionSearchProduct(Action):
             domain: dict):
 
         user_message = tracker.latest_message.get('text', '').lower().strip()
-        
-        is_price_only = any(kw in user_message for kw in ["under", "below", "over", "above", "between"]) and \
-                not any(kw in user_message for kw in ["show", "find", "search", "buy", "phone", "book", "coat", "laptop"])
 
         # 🚨 DEBUG: Check if this action is handling add to cart
         print(f"\n🔍 ActionSearchProduct received: '{user_message}'")
@@ -95,111 +722,60 @@ class ActionSearchProduct(Action):
             
         # Extract last remembered category
         last_category = tracker.get_slot("last_category")
-        
-        # 🔹 Synonym replacement
-        for category, synonyms in SYNONYMS.items():
-            for synonym in synonyms:
-                if synonym in user_message:
-                    user_message = user_message.replace(synonym, category)
-        if is_price_only and last_category:
-            selected_category = last_category
-            matched_products = PRODUCTS_DF[
-                PRODUCTS_DF['category'].str.lower().str.strip() == last_category
-            ]
-        else:
-            # Extract price filter if present
-            price_min, price_max = None, None
-            price_pattern = re.findall(r'(\d+)', user_message)
-            if "under" in user_message and price_pattern:
-                price_max = float(price_pattern[0])
-            elif "below" in user_message and price_pattern:
-                price_max = float(price_pattern[0])
-            elif "above" in user_message and price_pattern:
-                price_min = float(price_pattern[0])
-            elif "over" in user_message and price_pattern:
-                price_min = float(price_pattern[0])
 
-        # Match category using fuzzy logic
-        categories = PRODUCTS_DF['category'].str.lower().str.strip().unique().tolist()
-        products_name = PRODUCTS_DF['product_name'].str.lower().str.strip().unique().tolist()
-        matched_category, score = process.extractOne(user_message, categories)
-        matched_prod, prod_score = process.extractOne(user_message, products_name)
-        
-        if score >= 70:
-            selected_category = matched_category
-            matched_products = PRODUCTS_DF[
-                PRODUCTS_DF['category'].str.lower().str.strip() == matched_category]
-            
-        elif prod_score >= 60 :
-            lowered = PRODUCTS_DF['product_name'].astype(str).str.lower().str.strip()
+        catalog = CATALOG  # one catalog snapshot for the whole request
+        ranked, selected_category = search_catalog(user_message, last_category, catalog)
 
-            q = user_message.lower()
-            q_tokens = set(re.findall(r"[a-z0-9]+", q))
-        
-            contains_mask = lowered.apply(lambda n: any(tok in n for tok in q_tokens if len(tok) >= 4))
-            if "coat" in q:
-                contains_mask = contains_mask | lowered.str.contains("coat", na=False)
-        
-            fuzzy_hits = process.extract(user_message, lowered.tolist(), limit=120)
-            fuzzy_set = {n for (n, s) in fuzzy_hits if s >= max(55, prod_score - 15)}
-        
-            mask = contains_mask | lowered.isin(fuzzy_set)
-            matched_products = PRODUCTS_DF[mask]
-            selected_category = last_category
-            
-        else:
-            selected_category = last_category  # fallback to memory
-            matched_products = PRODUCTS_DF[
-                PRODUCTS_DF['product_name'].str.lower().str.contains(user_message)
-            ]
-
-        # Apply price filtering
-        if price_max is not None:
-            matched_products = matched_products[matched_products['price'] <= price_max]
-        if price_min is not None:
-            matched_products = matched_products[matched_products['price'] >= price_min]
-            
-        # ✅ Synonym fallback (only if nothing matched yet)
-        if matched_products.empty:
-            for category, synonyms in SYNONYMS.items():
-                if any(s in user_message for s in synonyms):
-                    matched_products = PRODUCTS_DF[
-                        PRODUCTS_DF['category'].str.lower().str.strip() == category
-                    ]
-                    break
-
-        if matched_products.empty:
+        if ranked.empty:
             dispatcher.utter_message(text="Sorry, no products match your search or price filter.")
             return []
-        
-        # 🔀 Shuffle for randomness
-        # --- DEDUP by normalized name to avoid repeated same product label with variants
-        tmp = matched_products.copy()
-        tmp["__name_norm__"] = tmp["product_name"].astype(str).str.lower().str.strip()
-        if "rating" in tmp.columns and "price" in tmp.columns:
-            tmp = tmp.sort_values(by=["rating", "price"], ascending=[False, True])
-        dedup = tmp.drop_duplicates(subset="__name_norm__", keep="first")
-        matched_products = dedup.sample(frac=1,random_state=None)
-        #matched_products = matched_products.sample(frac=1, random_state=None)
-
-        # 🧾 Send all results (not truncated)
-        dispatcher.utter_message(text=f"Here are some products I found ({len(matched_products)} total):")
-
-        product_list = []
-        for _, row in matched_products.iterrows():
-            product_list.append({
-                "product_name": row["product_name"],
-                "price": row["price"],
-                "category": row["category"],
-                "rating": row["rating"],
-                "stock_status": row["stock_status"],
-                "delivery_time": row["delivery_time"]
-            })
-
-        # ✅ Send as JSON so Streamlit can paginate
-        dispatcher.utter_message(json_message={"product_results": product_list})
-
-        return [SlotSet("last_category", selected_category)]
+
+        dispatcher.utter_message(text=f"Here are some products I found ({len(ranked)} total):")
+
+        if SEARCH_PAGE_SIZE <= 0:
+            # 🔀 Shuffle for randomness; 🧾 send all results (not truncated)
+            products = ranked.sample(frac=1, random_state=None)
+            dispatcher.utter_message(json_message={"product_results": product_results_payload(products)})
+            return [SlotSet("last_category", selected_category)]
+
+        # 📄 First page + opaque cursor; "show more" replays the search from the cursor
+        state = {"q": user_message, "c": last_category, "s": random.randrange(2**31), "o": 0}
+        page, next_cursor = _search_page(ranked, state)
+        dispatcher.utter_message(json_message={
+            "product_results": product_results_payload(page),
+            "total": len(ranked),
+            "next_cursor": next_cursor,
+        })
+
+        return [SlotSet("last_category", selected_category), SlotSet("search_cursor", next_cursor)]
+
+
+class ActionShowMoreProducts(Action):
+    def name(self) -> str:
+        return "action_show_more_products"
+
+    def run(self, dispatcher: CollectingDispatcher,
+            tracker: Tracker,
+            domain: dict):
+
+        cursor = next(tracker.get_latest_entity_values("search_cursor"), None) or tracker.get_slot("search_cursor")
+        state = _decode_search_cursor(cursor)
+        if not state:
+            dispatcher.utter_message(text="There are no more products to show. Try a new search!")
+            return [SlotSet("search_cursor", None)]
+
+        ranked, _ = search_catalog(state["q"], state.get("c"), CATALOG)
+        page, next_cursor = _search_page(ranked, state)
+        if page.empty:
+            dispatcher.utter_message(text="There are no more products to show. Try a new search!")
+            return [SlotSet("search_cursor", None)]
+
+        dispatcher.utter_message(json_message={
+            "product_results": product_results_payload(page),
+            "total": len(ranked),
+            "next_cursor": next_cursor,
+        })
+        return [SlotSet("search_cursor", next_cursor)]
 '''
 class ActionClearCategory(Action):
     def name(self) -> str:
@@ -213,6 +789,12 @@ class ActionClearCategory(Action):
         return [SlotSet("last_category", None)]
 '''
 
+_STOCK_FILLER_RE = re.compile(
+    r"\b(?:is|are|the|a|an|do|does|you|have|has|got|any|there|in stock|stock|available|availability|check|of|for|please)\b"
+)
+MAX_STOCK_LINES = 10
+
+
 class ActionCheckStock(Action):
     def name(self) -> str:
         return "action_check_stock"
@@ -222,17 +804,37 @@ class ActionCheckStock(Action):
             domain: dict):
         
         user_message = tracker.latest_message.get('text', '').lower()
+        query = _STOCK_FILLER_RE.sub(" ", user_message)
+        query = " ".join(re.sub(r"[^a-z0-9\s]", " ", query).split())
+
+        if not query:
+            dispatcher.utter_message(text="Which product should I check? e.g. 'Is smartphone in stock?'")
+            return []
 
-        matched_products = PRODUCTS_DF[PRODUCTS_DF['product_name'].str.lower().str.contains(user_message)]
+        # Literal name match first, then the best fuzzy match
+        catalog = CATALOG  # one catalog snapshot for the whole request
+        names = catalog.names_matching_phrase(query)
+        if not names:
+            candidates = catalog.candidate_names(query)
+            scores = fuzzy_scores([query], candidates, ADD_TO_CART_MATCH_SCORE)[0]
+            best, score = best_fuzzy_match(candidates, scores)
+            names = [best] if best is not None and score >= ADD_TO_CART_MATCH_SCORE else []
 
-        if matched_products.empty:
+        if not names:
             dispatcher.utter_message(text="I couldn't find that product in our stock.")
             return []
 
-        for _, row in matched_products.iterrows():
-            stock_info = f"{row['product_name']} is currently {row['stock_status']}."
-            dispatcher.utter_message(text=stock_info)
-        
+        display = catalog.df["product_name"].tolist()
+        stock = []
+        for name in names:
+            positions = catalog.name_rows[name]
+            for pos, entry in zip(positions, STOCK.lookup(catalog.name_skus[name])):
+                stock.append({"product_name": display[pos], **entry})
+
+        lines = [f"• {s['product_name']} is currently {s['stock_status']}." for s in stock[:MAX_STOCK_LINES]]
+        if len(stock) > MAX_STOCK_LINES:
+            lines.append(f"…and {len(stock) - MAX_STOCK_LINES} more.")
+        dispatcher.utter_message(text="📦 Stock check:\n" + "\n".join(lines), json_message={"stock": stock})
         return []
 
 def _parse_iso_dt(val):
@@ -247,17 +849,27 @@ def _parse_int(s, default=None):
     except Exception:
         return default
 
-def _business_days_from(start_dt: datetime, n_days: int) -> datetime:
+def _load_holidays(path: str) -> List[str]:
+    """ISO dates (one per line, or a CSV with a `date` column) that don't count as business days."""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [ln.strip().split(",")[0] for ln in f if ln.strip()]
+    return [ln for ln in lines if re.fullmatch(r"\d{4}-\d{2}-\d{2}", ln)]
+
+# Mon–Fri business days, minus the optional holiday calendar
+HOLIDAYS_PATH = os.environ.get("HOLIDAYS_PATH", "holidays.csv")
+BUSINESS_CALENDAR = np.busdaycalendar(weekmask="1111100", holidays=_load_holidays(HOLIDAYS_PATH))
+
+def _business_days_from(start_dt: datetime, n_days: int, calendar: np.busdaycalendar = BUSINESS_CALENDAR) -> datetime:
+    """The n-th business day after `start_dt` (same time of day), in closed form."""
     if n_days is None or n_days <= 0:
         return start_dt
-    days_added = 0
-    cur = start_dt
-    while days_added < n_days:
-        cur += timedelta(days=1)
-        if cur.weekday() < 5:  # Mon–Fri
-            days_added += 1
-    return cur
+    # Rolling a non-business start back first means "n business days after", like counting day by day
+    day = np.busday_offset(np.datetime64(start_dt.date(), "D"), n_days, roll="backward", busdaycal=calendar)
+    return datetime.combine(day.astype(datetime), start_dt.time())
 
+@lru_cache(maxsize=512)
 def _extract_delivery_sla(text: str):
     """
     Parse delivery_time strings into (min_days, max_days, is_business).
@@ -288,6 +900,19 @@ def _extract_delivery_sla(text: str):
             return (d, d, is_business)
     return (None, None, is_business)
 
+@lru_cache(maxsize=512)
+def _sla_days(delivery_time: str, policy: str = "max"):
+    """(days, is_business) for an SLA string under `policy`; unparseable SLAs mean 5 days."""
+    dmin, dmax, is_business = _extract_delivery_sla(delivery_time)
+    if dmin is None and dmax is None:
+        return 5, is_business
+    dmax = dmax if dmax is not None else dmin
+    if policy == "avg":
+        return int(round((dmin + dmax) / 2)), is_business
+    if policy == "min":
+        return dmin, is_business
+    return dmax, is_business
+
 def _compute_expected_from_sla(delivery_time: str, status: str, placed_at: datetime | None, shipped_at: datetime | None, policy: str = "max") -> datetime:
     """
     Convert SLA string to ETA using:
@@ -295,17 +920,7 @@ def _compute_expected_from_sla(delivery_time: str, status: str, placed_at: datet
     - anchor: shipped_at for Shipped/In transit, today for Out for delivery, else placed_at.
     """
     now = datetime.now()
-    dmin, dmax, is_business = _extract_delivery_sla(delivery_time)
-    if dmin is None and dmax is None:
-        days = 5
-    else:
-        dmax = dmax if dmax is not None else dmin
-        if policy == "avg":
-            days = int(round((dmin + dmax) / 2))
-        elif policy == "min":
-            days = dmin
-        else:
-            days = dmax
+    days, is_business = _sla_days(str(delivery_time), policy)
 
     s = (status or "").strip().lower()
     if s in {"shipped", "in transit"} and shipped_at:
@@ -322,6 +937,129 @@ def _compute_expected_from_sla(delivery_time: str, status: str, placed_at: datet
     return anchor + timedelta(days=days)
 
 
+def compute_etas(orders: pd.DataFrame, policy: str = "max", now: datetime | None = None,
+                 calendar: np.busdaycalendar = BUSINESS_CALENDAR) -> pd.Series:
+    """
+    Vectorized `_compute_expected_from_sla` over a whole orders table (same
+    columns and fallbacks as ActionTrackOrder). Returns ETAs aligned with `orders`.
+    """
+    now = pd.Timestamp(now or datetime.now())
+    n = len(orders)
+
+    def column(name):
+        return orders[name] if name in orders.columns else pd.Series([None] * n, index=orders.index)
+
+    sla_col = orders["delivery_time"] if "delivery_time" in orders.columns else column("expected_delivery")
+    sla = pd.Series([_sla_days(str(v), policy) for v in sla_col], index=orders.index, dtype=object)
+    days = np.array([d for d, _ in sla], dtype="int64")
+    is_business = np.array([b for _, b in sla], dtype=bool)
+
+    status = column("status").fillna("Processing").astype(str).str.strip().str.lower()
+    placed_at = pd.to_datetime(column("placed_at"), errors="coerce")
+    shipped_at = pd.to_datetime(column("shipped_at"), errors="coerce")
+
+    in_transit = status.isin(["shipped", "in transit"]) & shipped_at.notna()
+    anchor = shipped_at.where(in_transit, placed_at).fillna(now)
+
+    # Calendar-day SLAs are plain offsets; business-day SLAs go through busday_offset in one call
+    eta = anchor + pd.to_timedelta(days, unit="D")
+    if is_business.any():
+        start = anchor[is_business]
+        day = np.busday_offset(start.values.astype("datetime64[D]"), days[is_business],
+                               roll="backward", busdaycal=calendar)
+        time_of_day = start - start.dt.normalize()
+        business_eta = pd.to_datetime(day) + time_of_day.to_numpy()
+        business_eta = business_eta.where(days[is_business] > 0, start.to_numpy())
+        eta[is_business] = business_eta.to_numpy()
+
+    eta[status.isin(["out for delivery", "out-for-delivery"])] = now
+    delivered = status == "delivered"
+    eta[delivered] = shipped_at.fillna(placed_at).fillna(now)[delivered]
+    return eta
+
+
+class OrderIndex:
+    """
+    Case-normalized order_id -> row position map over the orders table, built
+    once at load so tracking never scans or re-uppercases the whole column.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        ids = self.df["order_id"].astype(str).str.strip().str.upper()
+        first = ~ids.duplicated()
+        self.rows_by_id: Dict[str, int] = dict(zip(ids[first], ids.index[first]))
+
+    def get(self, order_id: str | None):
+        """The order row for `order_id` (any case), or None."""
+        pos = self.rows_by_id.get((order_id or "").strip().upper())
+        return None if pos is None else self.df.iloc[pos]
+
+    def rows_for(self, order_ids: List[str]) -> pd.DataFrame:
+        """Rows for the known IDs among `order_ids`, in that order."""
+        positions = [self.rows_by_id[oid] for oid in order_ids if oid in self.rows_by_id]
+        return self.df.iloc[positions]
+
+    def extract_ids(self, text: str) -> List[str]:
+        """Known order IDs appearing as tokens in `text`, in order, without repeats."""
+        found = []
+        for tok in re.findall(r"[A-Z0-9_-]+", (text or "").upper()):
+            if tok in self.rows_by_id and tok not in found:
+                found.append(tok)
+        return found
+
+
+ORDERS = OrderIndex(ORDERS_DF)
+
+_ALL_ORDERS_RE = re.compile(r"\b(?:all|every)\b[\w\s]*\borders?\b|\bmy orders\b", re.IGNORECASE)
+
+
+def _user_orders(username: str | None) -> List[Dict[str, Any]]:
+    """Orders saved by the app for `username` in the user store."""
+    if not username:
+        return []
+    return USERS.get_field(username, "orders", []) or []
+
+
+def track_orders(order_ids: List[str], app_orders: List[Dict[str, Any]] | None = None) -> List[Dict[str, Any]]:
+    """
+    Status + ETA rows for many orders at once. Orders the app saved for the
+    user win over orders.csv rows with the same ID; ETAs for all of them come
+    from a single compute_etas() call.
+    """
+    saved = {str(o.get("order_id", "")).upper(): o for o in app_orders or []}
+    known = ORDERS.rows_for([oid for oid in order_ids if oid not in saved])
+    found = set(known["order_id"].astype(str).str.upper())
+    extra = [
+        {
+            "order_id": oid,
+            "product_name": ", ".join(str(it.get("name") or it.get("product") or "") for it in saved[oid].get("items", [])),
+            "status": saved[oid].get("status", "Processing"),
+        }
+        for oid in order_ids if oid not in found and oid in saved
+    ]
+    table = pd.concat([known, pd.DataFrame(extra)], ignore_index=True) if extra else known.reset_index(drop=True)
+    etas = compute_etas(table, policy="max") if len(table) else pd.Series(dtype="datetime64[ns]")
+
+    by_id = {}
+    for oid, product, status, eta in zip(
+        table["order_id"].astype(str).str.upper(),
+        table.get("product_name", pd.Series([""] * len(table))).astype(str),
+        table.get("status", pd.Series(["Processing"] * len(table))).astype(str),
+        etas,
+    ):
+        by_id.setdefault(oid, {
+            "order_id": oid,
+            "product_name": product,
+            "status": status,
+            "expected_delivery": eta.strftime("%d %b %Y") if pd.notna(eta) else None,
+        })
+    return [
+        by_id.get(oid, {"order_id": oid, "product_name": None, "status": "Not found", "expected_delivery": None})
+        for oid in order_ids
+    ]
+
+
 class ActionTrackOrder(Action):
     def name(self) -> str:
         return "action_track_order"
@@ -330,30 +1068,47 @@ class ActionTrackOrder(Action):
             tracker: Tracker,
             domain: dict):
         
-        # Extract order id from user message
+        # Extract order ids from user message
         user_message = tracker.latest_message.get('text', '') or ''
-        order_id = None
 
         # Try robust pattern first, then your simple scan
-        m = re.search(r"\bORD\d{3,}\b", user_message.upper())
-        if m:
-            order_id = m.group(0)
-        else:
-            for oid in ORDERS_DF['order_id']:
-                if oid.lower() in user_message.lower():
-                    order_id = oid
-                    break
-
-        if not order_id:
+        order_ids = list(dict.fromkeys(
+            re.findall(r"\bORD\d{3,}\b", user_message.upper()) + ORDERS.extract_ids(user_message)
+        ))
+
+        # "track all my orders": the orders saved on this login's account.
+        # orders.csv customer_name is a bare first name, not an account, so
+        # it is never used to decide whose orders these are.
+        wants_all = bool(_ALL_ORDERS_RE.search(user_message))
+        app_orders = []
+        if wants_all:
+            app_orders = _user_orders(tracker.sender_id)
+            order_ids = list(dict.fromkeys(
+                order_ids
+                + [str(o.get("order_id", "")).upper() for o in app_orders if o.get("order_id")]
+            ))
+
+        if not order_ids:
+            if wants_all:
+                dispatcher.utter_message(text="I couldn't find any orders on your account yet.")
+                return []
             dispatcher.utter_message(text="Please provide a valid order ID (e.g., ORD001).")
             return []
 
-        matched_order = ORDERS_DF[ORDERS_DF['order_id'].str.upper() == order_id.upper()]
-        if matched_order.empty:
-            dispatcher.utter_message(text=f"Sorry, I couldn't find any order with ID {order_id}.")
+        if len(order_ids) > 1 or wants_all:
+            rows = track_orders(order_ids, app_orders)
+            dispatcher.utter_message(
+                text=f"📦 Here's the status of your {len(rows)} order{'s' if len(rows) != 1 else ''}:",
+                json_message={"order_tracking": rows},
+            )
             return []
 
-        row = matched_order.iloc[0]
+        order_id = order_ids[0]
+
+        row = ORDERS.get(order_id)
+        if row is None:
+            dispatcher.utter_message(text=f"Sorry, I couldn't find any order with ID {order_id}.")
+            return []
 
         # Pull fields (keep your existing columns; add fallbacks)
         status = str(row.get('status', 'Processing'))
@@ -387,79 +1142,67 @@ class ActionAddToCart(Action):
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_message = tracker.latest_message.get("text", "").lower().strip()
+        requested_sku = next(tracker.get_latest_entity_values("sku"), None)
         
         # 🚨 DEBUG: Confirm this action is triggered
-        print(f"\n🛒 ActionAddToCart received: '{user_message}'")
+        print(f"\n🛒 ActionAddToCart received: '{user_message}' (sku={requested_sku})")
 
-        # 🧠 Clean the text by removing filler words
-        cleaned_message = re.sub(r"\b(add|to cart|cart|put|in|into|please)\b", "", user_message)
-        cleaned_message = re.sub(r"[^a-zA-Z0-9\s]", "", cleaned_message).strip()  # remove *, (), etc.
-
-        # Avoid empty string
-        if not cleaned_message:
-            dispatcher.utter_message(text="❌ Please specify a valid product name.")
-            return []
+        catalog = CATALOG  # one catalog snapshot for the whole request
 
-        # Try fuzzy matching on product name
-        product_names = PRODUCTS_DF['product_name'].str.lower().tolist()
-        best_match_tuple = process.extractOne(cleaned_message, product_names)
+        if requested_sku:
+            # 🔑 Button clicks name the exact product; no text matching needed
+            matched = catalog.by_sku(requested_sku)
+            if matched.empty:
+                dispatcher.utter_message(text="❌ Sorry, that product is no longer available.")
+                return []
+            best_match = catalog.names.iloc[matched.index[0]]
+        else:
+            # 🧠 Clean the text by removing filler words
+            cleaned_message = re.sub(r"\b(add|to cart|cart|put|in|into|please)\b", "", user_message)
+            cleaned_message = re.sub(r"[^a-zA-Z0-9\s]", "", cleaned_message).strip()  # remove *, (), etc.
 
-        if not best_match_tuple:
-            dispatcher.utter_message(text="❌ Sorry, I couldn't find that product.")
-            return []
+            # Avoid empty string
+            if not cleaned_message:
+                dispatcher.utter_message(text="❌ Please specify a valid product name.")
+                return []
 
-        best_match, score = best_match_tuple
+            # Try fuzzy matching on product name
+            name_candidates = catalog.candidate_names(cleaned_message)
+            scores = fuzzy_scores([cleaned_message], name_candidates, ADD_TO_CART_MATCH_SCORE)[0]
+            best_match, score = best_fuzzy_match(name_candidates, scores)
 
-        if score < 70:
-            dispatcher.utter_message(text="❌ Sorry, I couldn't find that product.")
-            return []
+            if best_match is None or score < ADD_TO_CART_MATCH_SCORE:
+                dispatcher.utter_message(text="❌ Sorry, I couldn't find that product.")
+                return []
+            matched = catalog.by_name(best_match)
 
-        matched_row = PRODUCTS_DF[PRODUCTS_DF['product_name'].str.lower() == best_match].iloc[0]
+        matched_row = matched.iloc[0]
         product_name = matched_row['product_name']
         price = matched_row['price']
+        sku = matched_row['sku']
 
-        # 🛒 Update cart
-        cart = tracker.get_slot("cart") or []
-        cart.append({"product": product_name, "price": price})
+        # 🛒 Update cart (one line per SKU, quantity aggregated)
+        cart = Cart.from_payload(tracker.get_slot("cart"))
+        cart.add(product_name, price, sku=sku)
 
         dispatcher.utter_message(text=f"✅ {product_name} added to your cart.")
         
         # 🔹 Recommend top-rated products from the same category
         category = matched_row['category']
         
-        category_products = PRODUCTS_DF[
-            (PRODUCTS_DF['category'] == category) &
-            (PRODUCTS_DF['product_name'] != product_name)
-        ]
-        
-        if not category_products.empty:
-            # ✅ Sort by rating (descending) and pick top 3
-            if "rating" in category_products.columns:
-                recommendations = category_products.sort_values(by="rating", ascending=False).head(3)
-            else:
-                # fallback if rating column is missing
-                recommendations = category_products.head(3)
-        
-            rec_list = []
-            for _, row in recommendations.iterrows():
-                rec_list.append({
-                    "product_name": row["product_name"],
-                    "price": row["price"],
-                    "category": row["category"],
-                    "rating": row.get("rating", "N/A")
-                })
+        # ✅ Precomputed top-rated table for the category, minus the item just added
+        rec_list = catalog.recommendations_for(category, exclude_name=best_match)
         
+        if rec_list:
             # CHANGED: Use custom instead of json_message for consistency
             dispatcher.utter_message(text="### 🛍️ You might also like these top-rated products:",
                                      custom={"recommendations": rec_list})
         
         print("\n===== DEBUG: Matched product =====")
         print(f"Product: {product_name}, Category: {category}")
-        print("===== DEBUG: Recommendations =====")
-        print(recommendations[['product_name', 'price']].head(3))
         print("===== DEBUG: Sending recommendations =====")
         print(rec_list)
-        return [SlotSet("cart", cart)]
+        return [SlotSet("cart", cart.to_payload())]
 
 
 
@@ -471,15 +1214,15 @@ class ActionShowCart(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        cart = tracker.get_slot("cart") or []
+        cart = Cart.from_payload(tracker.get_slot("cart"))
         if not cart:
             dispatcher.utter_message(text="🛒 Your cart is empty.")
             return []
 
-        total = sum(item["price"] for item in cart)
+        total = price_cart(cart.items()).subtotal
         message = "🛒 Your cart contains:\n"
         for item in cart:
-            message += f"• {item['product']} - ₹{item['price']}\n"
+            message += f"• {item['name']} × {item['qty']} - ₹{item['price']}\n"
         message += f"\n💰 Total: ₹{total}"
 
         dispatcher.utter_message(text=message)
@@ -495,16 +1238,19 @@ class ActionRemoveFromCart(Action):
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_message = tracker.latest_message.get("text", "").lower()
-        cart = tracker.get_slot("cart") or []
+        cart = Cart.from_payload(tracker.get_slot("cart"))
 
-        updated_cart = [item for item in cart if item["product"].lower() not in user_message]
+        # One unit per matching line, same as the app's cart_remove event
+        removed = [item["key"] for item in cart if item["name"].lower() in user_message]
+        for key in removed:
+            cart.remove(key)
 
-        if len(updated_cart) == len(cart):
+        if not removed:
             dispatcher.utter_message(text="❌ That product was not in your cart.")
         else:
             dispatcher.utter_message(text="🗑️ Item removed from your cart.")
 
-        return [SlotSet("cart", updated_cart)]
+        return [SlotSet("cart", cart.to_payload())]
 
 
 class ActionCheckout(Action):
@@ -515,20 +1261,29 @@ class ActionCheckout(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        cart = tracker.get_slot("cart") or []
+        cart = Cart.from_payload(tracker.get_slot("cart"))
         if not cart:
             dispatcher.utter_message(text="🛒 Your cart is empty, nothing to checkout.")
             return []
 
-        total = sum(item["price"] for item in cart)
-        order_id = "ORD" + datetime.datetime.now().strftime("%Y%m%d%H%M%S") + str(random.randint(100, 999))
+        totals = price_cart(cart.items())
+        order_id = "ORD" + datetime.now().strftime("%Y%m%d%H%M%S") + str(random.randint(100, 999))
+
+        # 📉 Sold units come off the live stock counters (untracked SKUs are skipped)
+        for item in cart.items():
+            if item["sku"]:
+                STOCK.adjust(item["sku"], -item["qty"])
 
         dispatcher.utter_message(
-            text=f"✅ Checkout successful!\n🧾 Order ID: {order_id}\n💰 Total Paid: ₹{total}\n📦 Your order will be delivered soon."
+            text=(
+                f"✅ Checkout successful!\n🧾 Order ID: {order_id}\n"
+                f"Subtotal ₹{totals.subtotal} • Shipping ₹{totals.shipping} • Tax ₹{totals.tax}\n"
+                f"💰 Total Paid: ₹{totals.total}\n📦 Your order will be delivered soon."
+            )
         )
 
         # Empty the cart after checkout
-        return [SlotSet("cart", [])]
+        return [SlotSet("cart", {})]
 
 # This is a simple example for a custom action which utters "Hello World!"
 
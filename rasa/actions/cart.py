@@ -0,0 +1,98 @@
+# Compact cart model shared by the Streamlit app, the user store journal and
+# the custom actions.
+#
+# A cart used to be a list with one {"name"/"product", "price"} dict per
+# click, so adding the same item five times stored five entries and the app
+# and the actions didn't even agree on the key names. A Cart holds one line
+# per product, keyed by product ID (SKU), with a quantity and the price
+# captured when it was first added:
+#
+#     {"P00012": {"name": "TechPro Smartphone", "price": 24999.0, "qty": 2}}
+#
+# That dict is what is persisted and put in the Rasa "cart" slot. Lines
+# added without a SKU are keyed by their normalized name. Old list-shaped
+# carts are converted on read by Cart.from_payload().
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+
+def cart_key(name: str, sku: Optional[str] = None) -> str:
+    """Line key: the SKU when known, else the normalized product name."""
+    if sku:
+        return str(sku).strip()
+    return "name:" + " ".join(str(name or "").lower().split())
+
+
+class Cart:
+    """Cart lines keyed by SKU; add/remove/lookup are O(1) dict operations."""
+
+    def __init__(self, lines: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        self.lines: Dict[str, Dict[str, Any]] = {k: dict(v) for k, v in (lines or {}).items()}
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> "Cart":
+        """Build from the stored dict form, or from a legacy list of {"name"/"product", "price", "qty"?} items."""
+        if isinstance(payload, Cart):
+            return cls(payload.lines)
+        if isinstance(payload, Mapping):
+            return cls(payload)
+        cart = cls()
+        for item in payload or []:
+            if isinstance(item, Mapping):
+                name = item.get("name") or item.get("product") or ""
+                cart.add(name, item.get("price", 0), int(item.get("qty", 1) or 1), sku=item.get("sku"))
+        return cart
+
+    def to_payload(self) -> Dict[str, Dict[str, Any]]:
+        return {k: dict(v) for k, v in self.lines.items()}
+
+    def add(self, name: str, price: Any, qty: int = 1, sku: Optional[str] = None) -> str:
+        """Add `qty` of a product; an existing line keeps its price snapshot. Returns the line key."""
+        key = cart_key(name, sku)
+        line = self.lines.get(key)
+        if line is None:
+            self.lines[key] = {"name": name, "price": float(price or 0), "qty": int(qty)}
+        else:
+            line["qty"] += int(qty)
+        return key
+
+    def remove(self, key: str, qty: Optional[int] = 1) -> bool:
+        """
+        Drop `qty` units of `key` (one by default, the whole line with
+        qty=None). False if it isn't in the cart.
+        """
+        line = self.lines.get(key)
+        if line is None:
+            return False
+        if qty is None or line["qty"] <= qty:
+            del self.lines[key]
+        else:
+            line["qty"] -= qty
+        return True
+
+    def find(self, name: str) -> Optional[str]:
+        """Key of the line whose product name matches `name` (case-insensitive), if any."""
+        key = cart_key(name)
+        if key in self.lines:
+            return key
+        wanted = key[len("name:"):]
+        return next((k for k, line in self.lines.items() if " ".join(line["name"].lower().split()) == wanted), None)
+
+    def items(self) -> List[Dict[str, Any]]:
+        """
+        Lines as [{"key", "sku", "name", "price", "qty"}], the shape pricing and
+        order history use. "sku" is None for lines keyed by name.
+        """
+        return [{"key": k, "sku": None if k.startswith("name:") else k, **line} for k, line in self.lines.items()]
+
+    def quantity(self) -> int:
+        return sum(line["qty"] for line in self.lines.values())
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.items())
+
+    def __bool__(self) -> bool:
+        return bool(self.lines)
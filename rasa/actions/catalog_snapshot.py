@@ -0,0 +1,181 @@
+# Columnar snapshots of the product catalog.
+#
+# Parsing products.csv on every action-server start is slow for a large
+# catalog. The first load writes an Arrow IPC file next to the CSV
+# (products.csv -> products.arrow); later loads memory-map that file instead
+# of parsing text. The snapshot records the (mtime, size) of the CSV it was
+# built from, and is only used while the CSV still matches; a CSV replaced
+# by any means (including renaming an older file over it) is re-parsed. To
+# rebuild it by hand:
+#
+#     python -m actions.catalog_snapshot products.csv
+#
+# pyarrow is optional: without it everything falls back to pd.read_csv.
+#
+# Every product gets a stable "sku" column on load (see assign_skus), which
+# carts, orders and the app's Add buttons use instead of the product name.
+# To write the SKUs into the CSV itself, so they survive renames and edits:
+#
+#     python -m actions.catalog_snapshot --assign-skus products.csv
+
+import hashlib
+import os
+import sys
+import tempfile
+from typing import Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Schema metadata key holding the "mtime_ns:size" of the CSV a snapshot was built from
+SOURCE_KEY = b"source_csv"
+
+
+def snapshot_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def derive_skus(df: pd.DataFrame) -> pd.Series:
+    """
+    Content-derived SKUs: a hash of the normalized name and category, plus
+    the row's ordinal among identical (name, category) rows. Unchanged by
+    reordering, appending or deleting other products.
+    """
+    def _norm(column: str) -> pd.Series:
+        if column not in df.columns:
+            return pd.Series([""] * len(df), index=df.index)
+        return df[column].astype(str).str.lower().str.split().str.join(" ")
+
+    keys = _norm("product_name") + "|" + _norm("category")
+    ordinals = keys.groupby(keys).cumcount().astype(str)
+    return (keys + "|" + ordinals).map(
+        lambda k: "SKU-" + hashlib.sha1(k.encode("utf-8")).hexdigest()[:10].upper()
+    )
+
+
+def _column_skus(df: pd.DataFrame, column: str) -> pd.Series:
+    if column not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    return df[column].astype("string").str.strip().replace("", pd.NA)
+
+
+def assign_skus(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` with a filled "sku" column: its own value where present, else the
+    product_id column, else derive_skus().
+    """
+    skus = _column_skus(df, "sku").fillna(_column_skus(df, "product_id"))
+    if skus.isna().any():
+        skus = skus.fillna(derive_skus(df).astype("string"))
+    return df.assign(sku=skus.astype(str))
+
+
+def write_csv_skus(csv_path: str) -> int:
+    """Fill in the "sku" column of `csv_path` in place. Returns how many rows were missing one."""
+    df = pd.read_csv(csv_path)
+    missing = int(_column_skus(df, "sku").isna().sum())
+    if missing:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csv_path)), suffix=".tmp")
+        os.close(fd)
+        try:
+            assign_skus(df).to_csv(tmp, index=False)
+            os.replace(tmp, csv_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    return missing
+
+
+def catalog_signature(csv_path: str):
+    """(mtime, size) of the CSV and its snapshot; changes whenever either file is replaced."""
+    return (_stat(csv_path), _stat(snapshot_path_for(csv_path)))
+
+
+def _source_tag(csv_stat: Optional[Tuple[int, int]]) -> bytes:
+    return f"{csv_stat[0]}:{csv_stat[1]}".encode() if csv_stat else b""
+
+
+def write_snapshot(df: pd.DataFrame, snapshot_path: str, csv_stat: Optional[Tuple[int, int]] = None) -> None:
+    """
+    Write `df` as an Arrow IPC file, atomically (temp file + rename).
+    `csv_stat` is the (mtime, size) of the source CSV, kept in the schema metadata.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SOURCE_KEY: _source_tag(csv_stat)})
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(snapshot_path)), suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, snapshot_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def snapshot_source(snapshot_path: str) -> Optional[bytes]:
+    """The source-CSV tag stored in a snapshot, or None if it has none or can't be read."""
+    try:
+        with pa.memory_map(snapshot_path, "r") as source:
+            return (pa.ipc.open_file(source).schema.metadata or {}).get(SOURCE_KEY)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def read_snapshot(snapshot_path: str) -> pd.DataFrame:
+    # The map stays open for as long as Arrow buffers reference it
+    source = pa.memory_map(snapshot_path, "r")
+    return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def build_snapshot(csv_path: str) -> str:
+    snapshot_path = snapshot_path_for(csv_path)
+    csv_stat = _stat(csv_path)
+    write_snapshot(assign_skus(pd.read_csv(csv_path)), snapshot_path, csv_stat)
+    return snapshot_path
+
+
+def load_products(csv_path: str) -> pd.DataFrame:
+    """
+    Load the catalog, preferring a snapshot built from the current CSV
+    (same mtime and size). A CSV load refreshes the snapshot for the next start.
+    """
+    snapshot_path = snapshot_path_for(csv_path)
+    csv_stat, snap_stat = catalog_signature(csv_path)
+    if pa is not None and snap_stat and (csv_stat is None or snapshot_source(snapshot_path) == _source_tag(csv_stat)):
+        return assign_skus(read_snapshot(snapshot_path))
+
+    df = assign_skus(pd.read_csv(csv_path))
+    if pa is not None:
+        try:
+            write_snapshot(df, snapshot_path, csv_stat)
+        except OSError as e:
+            print(f"⚠️ Could not write catalog snapshot {snapshot_path}: {e}")
+    return df
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--assign-skus"]:
+        for path in args[1:] or ["products.csv"]:
+            print(f"✅ {path}: {write_csv_skus(path)} SKUs assigned")
+        sys.exit(0)
+    if pa is None:
+        sys.exit("pyarrow is required to build catalog snapshots.")
+    for path in args or ["products.csv"]:
+        print(f"✅ {path} -> {build_snapshot(path)}")
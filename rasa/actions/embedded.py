@@ -0,0 +1,171 @@
+# In-process runner for the custom actions (single-node mode).
+#
+# Normally a turn goes Streamlit -> Rasa server -> action server over two
+# HTTP hops. For messages that already name their intent ("/track_order{...}",
+# as produced by the app's fast-path router) no NLU is needed, so the app can
+# run the matching Action class right here with a small tracker/dispatcher
+# stand-in and get back responses in the same shape as the REST webhook.
+#
+# Also handy for exercising or benchmarking actions without a Rasa server:
+#
+#     runner = EmbeddedActions()
+#     runner.run_action("action_check_stock", "alice", "is smartphone in stock")
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:  # only needed to resolve `response="utter_..."` templates
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_DOMAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "domain.yml")
+
+# Intents that are safe to run in-process: their actions need nothing from
+# the dialogue policy beyond the message itself
+DEFAULT_INTENT_ACTIONS = {
+    "track_order": "action_track_order",
+    "show_more_products": "action_show_more_products",
+}
+
+_INTENT_MESSAGE_RE = re.compile(r"^/(?P<intent>[\w-]+)(?P<entities>\{.*\})?\s*$", re.DOTALL)
+
+
+def parse_intent_message(message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Split "/intent{"entity": value}" into (intent, entities); None for free text."""
+    m = _INTENT_MESSAGE_RE.match((message or "").strip())
+    if not m:
+        return None
+    try:
+        entities = json.loads(m.group("entities")) if m.group("entities") else {}
+    except json.JSONDecodeError:
+        return None
+    return m.group("intent"), entities if isinstance(entities, dict) else {}
+
+
+def load_domain_responses(domain_path: str = DEFAULT_DOMAIN_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    if yaml is None or not os.path.exists(domain_path):
+        return {}
+    with open(domain_path, "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("responses", {}) or {}
+
+
+class LocalTracker:
+    """The slice of rasa_sdk.Tracker the custom actions use."""
+
+    def __init__(self, sender_id: str, slots: Dict[str, Any], latest_message: Dict[str, Any]):
+        self.sender_id = sender_id
+        self.slots = slots
+        self.latest_message = latest_message
+        self.events: List[Dict[str, Any]] = []
+
+    def get_slot(self, key: str) -> Any:
+        return self.slots.get(key)
+
+    def current_slot_values(self) -> Dict[str, Any]:
+        return dict(self.slots)
+
+    def get_latest_entity_values(self, entity_type: str, entity_role: Optional[str] = None,
+                                 entity_group: Optional[str] = None) -> Iterator[str]:
+        return (
+            e.get("value")
+            for e in self.latest_message.get("entities", [])
+            if e.get("entity") == entity_type
+            and e.get("role") == entity_role
+            and e.get("group") == entity_group
+        )
+
+
+class LocalDispatcher:
+    """Collects utterances directly in REST-webhook shape ({"recipient_id", "text", "custom", ...})."""
+
+    def __init__(self, recipient_id: str, responses: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.recipient_id = recipient_id
+        self.responses = responses or {}
+        self.messages: List[Dict[str, Any]] = []
+
+    def utter_message(self, text: Optional[str] = None, image: Optional[str] = None,
+                      json_message: Optional[Dict[str, Any]] = None, response: Optional[str] = None,
+                      attachment: Optional[str] = None, buttons: Optional[List[Dict[str, Any]]] = None,
+                      **kwargs: Any) -> None:
+        if response and text is None:
+            variants = self.responses.get(response) or [{}]
+            text = variants[0].get("text", response)
+        message: Dict[str, Any] = {"recipient_id": self.recipient_id}
+        if text is not None:
+            message["text"] = text
+        if json_message is not None:
+            message["custom"] = json_message
+        if image:
+            message["image"] = image
+        if attachment:
+            message["attachment"] = attachment
+        if buttons:
+            message["buttons"] = buttons
+        # Anything else passes through as-is, like rasa_sdk's CollectingDispatcher;
+        # so a `custom=` kwarg takes precedence over `json_message`
+        message.update(kwargs)
+        self.messages.append(message)
+
+
+class EmbeddedActions:
+    """
+    Registry of the Action classes in actions.actions, run in-process.
+    Slots are kept per sender and updated from returned SlotSet events.
+    """
+
+    def __init__(self, module: Any = None, intent_actions: Optional[Dict[str, str]] = None,
+                 domain_path: str = DEFAULT_DOMAIN_PATH):
+        if module is None:
+            # Heavy import (catalog, orders, user store); deferred until the mode is used
+            from actions import actions as module
+        from rasa_sdk import Action
+
+        self.actions = {
+            obj().name(): obj()
+            for obj in vars(module).values()
+            if isinstance(obj, type) and issubclass(obj, Action) and obj is not Action
+        }
+        self.intent_actions = dict(DEFAULT_INTENT_ACTIONS if intent_actions is None else intent_actions)
+        self.responses = load_domain_responses(domain_path)
+        self.slots: Dict[str, Dict[str, Any]] = {}
+
+    def handles(self, message: str) -> bool:
+        parsed = parse_intent_message(message)
+        return parsed is not None and self.intent_actions.get(parsed[0]) in self.actions
+
+    def handle_message(self, sender_id: str, message: str) -> Optional[List[Dict[str, Any]]]:
+        """Responses for an in-process intent message, or None if it has to go to Rasa."""
+        parsed = parse_intent_message(message)
+        if parsed is None:
+            return None
+        intent, entities = parsed
+        action_name = self.intent_actions.get(intent)
+        if action_name not in self.actions:
+            return None
+        return self.run_action(action_name, sender_id, message, entities, intent=intent)
+
+    def run_action(self, action_name: str, sender_id: str, text: str,
+                   entities: Optional[Dict[str, Any]] = None, intent: Optional[str] = None) -> List[Dict[str, Any]]:
+        entities = entities or {}
+        slots = self.slots.setdefault(sender_id, {})
+        # from_entity slot mappings: an entity fills the slot of the same name
+        slots.update(entities)
+        latest_message = {
+            "text": text,
+            "intent": {"name": intent, "confidence": 1.0} if intent else {},
+            "entities": [{"entity": k, "value": v} for k, v in entities.items()],
+        }
+        tracker = LocalTracker(sender_id, slots, latest_message)
+        dispatcher = LocalDispatcher(sender_id, self.responses)
+        try:
+            events = self.actions[action_name].run(dispatcher, tracker, {"responses": self.responses}) or []
+        except Exception as e:
+            print(f"❌ Embedded {action_name} failed: {e}")
+            return [{"recipient_id": sender_id, "text": "⚠️ Sorry, something went wrong handling that."}]
+        for event in events:
+            if isinstance(event, dict) and event.get("event") == "slot":
+                slots[event["name"]] = event.get("value")
+        return dispatcher.messages
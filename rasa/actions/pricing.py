@@ -0,0 +1,199 @@
+# Cart pricing shared by the Streamlit app and the action server.
+#
+# One place for the subtotal -> coupon -> shipping -> tax -> total pipeline,
+# in Decimal money math (rounded half-up to paise at each step, as the
+# receipts show them). Quotes are memoized per (cart key, cart version,
+# rules version): a rerun that asks for the same cart's totals several
+# times computes them once, and changing a coupon or price rule bumps the
+# rules version so every cached quote goes stale. reprice_many() recomputes
+# a batch of carts after such a change.
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Callable, Dict, Hashable, Iterable, Mapping, Optional, Sequence, Tuple
+
+CENT = Decimal("0.01")
+
+
+def money(value: Any) -> Decimal:
+    """Decimal rupees rounded to paise; floats go through str() so 0.1 stays 0.1."""
+    if isinstance(value, Decimal):
+        d = value
+    else:
+        d = Decimal(str(value if value not in (None, "") else 0))
+    return d.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class Coupon:
+    code: str
+    type: str  # "percent" or "flat"
+    value: Decimal
+
+    def discount(self, subtotal: Decimal) -> Decimal:
+        if self.type == "percent":
+            return money(subtotal * self.value / 100)
+        if self.type == "flat":
+            return money(min(self.value, subtotal))
+        return money(0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Shape stored on the user record
+        return {"code": self.code, "type": self.type, "value": float(self.value)}
+
+
+@dataclass(frozen=True)
+class Totals:
+    subtotal: Decimal
+    discount: Decimal
+    shipping: Decimal
+    tax: Decimal
+    total: Decimal
+
+    def as_floats(self) -> Tuple[float, float, float, float, float]:
+        """(subtotal, discount, shipping, tax, total) as floats, for JSON and display."""
+        return (float(self.subtotal), float(self.discount), float(self.shipping), float(self.tax), float(self.total))
+
+
+@dataclass(frozen=True)
+class PriceRules:
+    free_shipping_threshold: Decimal = Decimal("999")
+    shipping_fee: Decimal = Decimal("49")
+    tax_rate: Decimal = Decimal("0.18")
+
+
+_rules_lock = threading.Lock()
+COUPONS: Dict[str, Coupon] = {
+    "SAVE10": Coupon("SAVE10", "percent", Decimal("10")),
+    "LESS50": Coupon("LESS50", "flat", Decimal("50")),
+    "FREE": Coupon("FREE", "flat", Decimal("100")),
+}
+RULES = PriceRules()
+RULES_VERSION = 0
+
+
+def _bump_rules() -> None:
+    global RULES_VERSION
+    RULES_VERSION += 1
+
+
+def register_coupon(code: str, type: str, value: Any) -> Coupon:
+    """Add or change a coupon rule; cached quotes are invalidated."""
+    if type not in ("percent", "flat"):
+        raise ValueError(f"Unknown coupon type: {type}")
+    coupon = Coupon(code.upper(), type, Decimal(str(value)))
+    with _rules_lock:
+        COUPONS[coupon.code] = coupon
+        _bump_rules()
+    return coupon
+
+
+def remove_coupon(code: str) -> None:
+    with _rules_lock:
+        if COUPONS.pop(code.upper(), None) is not None:
+            _bump_rules()
+
+
+def set_price_rules(**changes: Any) -> PriceRules:
+    """Change shipping / tax rules, e.g. set_price_rules(tax_rate="0.12"); cached quotes are invalidated."""
+    global RULES
+    fields = {k: Decimal(str(v)) for k, v in changes.items()}
+    with _rules_lock:
+        RULES = PriceRules(**{**RULES.__dict__, **fields})
+        _bump_rules()
+    return RULES
+
+
+def get_coupon(code: str) -> Optional[Coupon]:
+    return COUPONS.get((code or "").strip().upper())
+
+
+def coupon_from_record(record: Any) -> Optional[Coupon]:
+    """
+    The coupon stored on a user record (or a bare code). A code still in the
+    registry uses the current rule; retired codes keep the terms saved when
+    applied.
+    """
+    if not record:
+        return None
+    if isinstance(record, str):
+        return get_coupon(record)
+    current = get_coupon(record.get("code", ""))
+    if current is not None:
+        return current
+    if record.get("type") in ("percent", "flat"):
+        return Coupon(str(record.get("code", "")), record["type"], Decimal(str(record.get("value", 0))))
+    return None
+
+
+def price_cart(items: Sequence[Mapping[str, Any]], coupon: Any = None,
+               price_of: Optional[Callable[[Mapping[str, Any]], Any]] = None) -> Totals:
+    """
+    Totals for a list of cart items ({"price", "qty"?, ...}). `coupon` is a
+    Coupon, a stored coupon dict, a code, or None. `price_of` overrides the
+    item's price snapshot (e.g. current catalog price) when repricing.
+    """
+    if not isinstance(coupon, Coupon):
+        coupon = coupon_from_record(coupon)
+    rules = RULES
+    subtotal = money(sum(
+        (money(price_of(it) if price_of else it.get("price", 0)) * int(it.get("qty", 1)) for it in items),
+        Decimal(0),
+    ))
+    discount = coupon.discount(subtotal) if coupon else money(0)
+    tax_base = max(money(0), subtotal - discount)
+    shipping = money(0) if tax_base >= rules.free_shipping_threshold else money(rules.shipping_fee)
+    tax = money(tax_base * rules.tax_rate)
+    return Totals(subtotal, discount, shipping, tax, money(tax_base + shipping + tax))
+
+
+class CartPricer:
+    """LRU of quotes keyed by cart, valid for one (cart version, rules version). Thread-safe."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._quotes: "OrderedDict[Hashable, Tuple[Any, int, Totals]]" = OrderedDict()
+
+    def quote(self, key: Hashable, version: Any, items: Sequence[Mapping[str, Any]], coupon: Any = None) -> Totals:
+        """Totals for cart `key` at `version`; recomputed only when the cart or a rule changed."""
+        rules_version = RULES_VERSION
+        with self._lock:
+            hit = self._quotes.get(key)
+            if hit is not None and hit[0] == version and hit[1] == rules_version:
+                self._quotes.move_to_end(key)
+                return hit[2]
+        totals = price_cart(items, coupon)
+        self._store(key, version, rules_version, totals)
+        return totals
+
+    def reprice_many(self, carts: Iterable[Tuple[Hashable, Any, Sequence[Mapping[str, Any]], Any]],
+                     price_of: Optional[Callable[[Mapping[str, Any]], Any]] = None) -> Dict[Hashable, Totals]:
+        """
+        Reprice (key, version, items, coupon) carts in one pass, e.g. after a
+        coupon or price rule change, and refresh their cached quotes.
+        """
+        rules_version = RULES_VERSION
+        out = {}
+        for key, version, items, coupon in carts:
+            out[key] = price_cart(items, coupon, price_of)
+            if price_of is None:
+                # Only snapshot-priced quotes are what quote() would return
+                self._store(key, version, rules_version, out[key])
+        return out
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._quotes.pop(key, None)
+
+    def _store(self, key: Hashable, version: Any, rules_version: int, totals: Totals) -> None:
+        with self._lock:
+            self._quotes[key] = (version, rules_version, totals)
+            self._quotes.move_to_end(key)
+            while len(self._quotes) > self.maxsize:
+                self._quotes.popitem(last=False)
+
+
+PRICER = CartPricer()
@@ -0,0 +1,418 @@
+# Embedded per-user store shared by the Streamlit app and the action server.
+#
+# users_data.json used to be read and rewritten whole for every login, cart
+# add, address change and checkout, so each write cost O(all users). Here
+# every user field (password, cart, orders, addresses, coupon, last_search,
+# ...) is its own SQLite row keyed by (username, field): reading or writing
+# one user's cart only touches that row.
+#
+# Cart and order changes (add, remove, coupon, checkout) are not rewritten
+# in place: they are appended to the cart_events journal, so a write costs
+# O(event) however long the cart or order history is. Reads fold a user's
+# pending events over their snapshot fields; compact() periodically folds
+# the journal into the snapshot and drops it. The store runs in WAL mode
+# with synchronous=NORMAL, so commits are fsynced in batches at checkpoint
+# time, and a crash can lose only the last few events, never the database.
+#
+# Every write bumps a per-user version inside its transaction. Writers that
+# read a record, change it and write it back pass the version they read as
+# `expected_version` (or use update_user(), which retries): if another app
+# session or the action server wrote to that user in between, the write is
+# rejected with VersionConflict instead of silently losing their update.
+#
+# The first open of an empty store imports an existing users_data.json once;
+# the JSON file is left in place untouched.
+#
+# Point the app and the action server at the same file with USER_STORE_PATH.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from actions.cart import Cart
+
+DEFAULT_STORE_PATH = os.getenv("USER_STORE_PATH", "users.db")
+COMPACT_INTERVAL = float(os.getenv("USER_JOURNAL_COMPACT_INTERVAL", "60"))
+
+# Fields owned by the event journal
+JOURNALED_FIELDS = ("cart", "orders", "coupon")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_fields (
+    username TEXT NOT NULL,
+    field    TEXT NOT NULL,
+    value    TEXT NOT NULL,
+    PRIMARY KEY (username, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cart_events (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    kind     TEXT NOT NULL,
+    payload  TEXT NOT NULL,
+    ts       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cart_events_user ON cart_events (username, seq);
+CREATE TABLE IF NOT EXISTS user_versions (
+    username TEXT PRIMARY KEY,
+    version  INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class VersionConflict(Exception):
+    """A user record changed between read and write."""
+
+    def __init__(self, username: str, expected: int, actual: int):
+        super().__init__(f"User {username!r} is at version {actual}, expected {expected}")
+        self.username = username
+        self.expected = expected
+        self.actual = actual
+
+
+def _legacy_records(data: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Normalize the shapes users_data.json has accumulated:
+      - app format:     {"alice": {"password": ..., "cart": [...], ...}}
+      - actions format: {"users": {"alice": {"password": ..., "cart": [...]}}}
+      - bare password:  {"alice": "secret"}
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    nested = data.get("users")
+    if isinstance(nested, dict) and "password" not in nested and all(isinstance(v, dict) for v in nested.values()):
+        for username, rec in nested.items():
+            if username:
+                records[username] = dict(rec)
+        data = {k: v for k, v in data.items() if k != "users"}
+
+    for username, rec in data.items():
+        if not username:
+            continue
+        if isinstance(rec, str):
+            rec = {"password": rec}
+        if isinstance(rec, dict):
+            # App records win over the actions-format copy of the same user
+            records[username] = {**records.get(username, {}), **rec}
+    return records
+
+
+def apply_event(record: Dict[str, Any], kind: str, payload: Mapping[str, Any]) -> Dict[str, Any]:
+    """Fold one journal event into a user record (in place) and return it."""
+    if kind == "cart_add":
+        item = payload["item"]
+        cart = Cart.from_payload(record.get("cart"))
+        cart.add(item["name"], item.get("price", 0), int(item.get("qty", 1)), sku=item.get("sku"))
+        record["cart"] = cart.to_payload()
+    elif kind == "cart_remove":
+        # One unit (or `qty`) of the line given by key, or by product name
+        cart = Cart.from_payload(record.get("cart"))
+        key = payload.get("key") or cart.find(payload.get("name", ""))
+        if key:
+            cart.remove(key, payload.get("qty", 1))
+        record["cart"] = cart.to_payload()
+    elif kind == "coupon_apply":
+        record["coupon"] = payload["coupon"]
+    elif kind == "coupon_remove":
+        record.pop("coupon", None)
+    elif kind == "checkout":
+        record["orders"] = list(record.get("orders") or []) + [payload["order"]]
+        record["cart"] = {}
+        record.pop("coupon", None)
+    else:
+        raise ValueError(f"Unknown cart event: {kind}")
+    return record
+
+
+class UserStore:
+    """Key/value store of user records, one row per (username, field). Thread-safe."""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._compactor: Optional[threading.Thread] = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---------- reads ----------
+    def has_user(self, username: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM user_fields WHERE username = ? LIMIT 1", (username,)
+            ).fetchone()
+        return row is not None
+
+    def usernames(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT username FROM user_fields ORDER BY username")]
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """The whole record for `username`, or None if there is no such user."""
+        return self.get_user_version(username)[0]
+
+    def get_user_version(self, username: str) -> tuple:
+        """(record or None, version) read in one transaction; pass the version back as `expected_version`."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")  # snapshot + journal + version from one consistent read
+            rows = self._conn.execute(
+                "SELECT field, value FROM user_fields WHERE username = ?", (username,)
+            ).fetchall()
+            events = self._pending_events(username)
+            version = self._version(username)
+        if not rows:
+            return None, version
+        record = {field: json.loads(value) for field, value in rows}
+        for kind, payload in events:
+            apply_event(record, kind, payload)
+        return record, version
+
+    def version(self, username: str) -> int:
+        """Current version of one user (0 if never written); cheap enough to poll for cache checks."""
+        with self._lock:
+            return self._version(username)
+
+    def _version(self, username: str) -> int:
+        row = self._conn.execute("SELECT version FROM user_versions WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, username: str, expected_version: Optional[int]) -> int:
+        # Caller holds the lock inside an IMMEDIATE transaction, so check-and-bump is atomic across processes
+        current = self._version(username)
+        if expected_version is not None and current != expected_version:
+            raise VersionConflict(username, expected_version, current)
+        self._conn.execute(
+            "INSERT INTO user_versions (username, version) VALUES (?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET version = excluded.version",
+            (username, current + 1),
+        )
+        return current + 1
+
+    def get_field(self, username: str, field: str, default: Any = None) -> Any:
+        if field in JOURNALED_FIELDS:
+            return (self.get_user(username) or {}).get(field, default)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM user_fields WHERE username = ? AND field = ?", (username, field)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _pending_events(self, username: str) -> List[tuple]:
+        return [
+            (kind, json.loads(payload))
+            for kind, payload in self._conn.execute(
+                "SELECT kind, payload FROM cart_events WHERE username = ? ORDER BY seq", (username,)
+            )
+        ]
+
+    def check_password(self, username: str, password: str) -> bool:
+        return self.has_user(username) and self.get_field(username, "password") == password
+
+    # ---------- writes ----------
+    def set_fields(self, username: str, fields: Mapping[str, Any], expected_version: Optional[int] = None) -> int:
+        """
+        Upsert the given fields of one user in a single transaction; other
+        fields are untouched. Returns the new version.
+        """
+        rows = [(username, field, json.dumps(value)) for field, value in fields.items()]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            version = self._bump(username, expected_version)
+            if any(field in JOURNALED_FIELDS for field in fields):
+                # Overwriting a journaled field: fold pending events first so they can't replay on top
+                self._fold_user(username)
+            self._conn.executemany(
+                "INSERT INTO user_fields (username, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(username, field) DO UPDATE SET value = excluded.value",
+                rows,
+            )
+        return version
+
+    def delete_fields(self, username: str, fields: Iterable[str], expected_version: Optional[int] = None) -> int:
+        fields = list(fields)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            version = self._bump(username, expected_version)
+            if any(field in JOURNALED_FIELDS for field in fields):
+                self._fold_user(username)
+            self._conn.executemany(
+                "DELETE FROM user_fields WHERE username = ? AND field = ?",
+                [(username, field) for field in fields],
+            )
+        return version
+
+    def update_user(self, username: str, mutate: Callable[[Dict[str, Any]], Mapping[str, Any]], retries: int = 5) -> int:
+        """
+        Optimistic read-modify-write: `mutate(record)` returns the fields to
+        write, and is re-run on a fresh read if another writer got in first.
+        """
+        for _ in range(retries):
+            record, version = self.get_user_version(username)
+            try:
+                return self.set_fields(username, mutate(record or {}), expected_version=version)
+            except VersionConflict:
+                continue
+        raise VersionConflict(username, version, self.get_user_version(username)[1])
+
+    def create_user(self, username: str, password: str) -> bool:
+        """Register a new user with an empty cart and order list. False if the name is taken."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute(
+                "SELECT 1 FROM user_fields WHERE username = ? LIMIT 1", (username,)
+            ).fetchone():
+                return False
+            self._bump(username, None)
+            self._conn.executemany(
+                "INSERT INTO user_fields (username, field, value) VALUES (?, ?, ?)",
+                [(username, f, json.dumps(v)) for f, v in (("password", password), ("cart", {}), ("orders", []))],
+            )
+        return True
+
+    # ---------- cart/order journal ----------
+    def append_event(self, username: str, kind: str, payload: Mapping[str, Any],
+                     expected_version: Optional[int] = None) -> int:
+        """
+        Journal one cart/order event: add, remove, coupon or checkout. Pass
+        `expected_version` when the event was computed from a read record
+        (e.g. checkout totals). Returns the new version.
+        """
+        return self.append_events([(username, kind, payload)], expected_version={username: expected_version})[username]
+
+    def append_events(self, events: Iterable[tuple],
+                      expected_version: Optional[Mapping[str, Optional[int]]] = None) -> Dict[str, int]:
+        """
+        Journal several (username, kind, payload) events in one transaction.
+        Returns {username: new version}.
+        """
+        now = time.time()
+        rows = []
+        for username, kind, payload in events:
+            apply_event({}, kind, payload)  # reject unknown kinds / malformed payloads before writing
+            rows.append((username, kind, json.dumps(payload), now))
+        expected_version = expected_version or {}
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            versions = {u: self._bump(u, expected_version.get(u)) for u in dict.fromkeys(r[0] for r in rows)}
+            self._conn.executemany(
+                "INSERT INTO cart_events (username, kind, payload, ts) VALUES (?, ?, ?, ?)", rows
+            )
+        return versions
+
+    def pending_event_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cart_events").fetchone()[0]
+
+    def _fold_user(self, username: str) -> None:
+        # Caller holds the lock inside an IMMEDIATE transaction
+        events = self._pending_events(username)
+        if not events:
+            return
+        placeholders = ",".join("?" * len(JOURNALED_FIELDS))
+        record = {
+            field: json.loads(value)
+            for field, value in self._conn.execute(
+                f"SELECT field, value FROM user_fields WHERE username = ? AND field IN ({placeholders})",
+                (username, *JOURNALED_FIELDS),
+            )
+        }
+        for kind, payload in events:
+            apply_event(record, kind, payload)
+        self._conn.executemany(
+            "INSERT INTO user_fields (username, field, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, field) DO UPDATE SET value = excluded.value",
+            [(username, field, json.dumps(record[field])) for field in JOURNALED_FIELDS if field in record],
+        )
+        self._conn.executemany(
+            "DELETE FROM user_fields WHERE username = ? AND field = ?",
+            [(username, field) for field in JOURNALED_FIELDS if field not in record],
+        )
+        self._conn.execute("DELETE FROM cart_events WHERE username = ?", (username,))
+
+    def compact(self) -> int:
+        """Fold the whole journal into the snapshot fields. Returns the number of users compacted."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            users = [r[0] for r in self._conn.execute("SELECT DISTINCT username FROM cart_events")]
+            for username in users:
+                self._fold_user(username)
+        if users:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return len(users)
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL) -> None:
+        """Compact the journal every `interval` seconds on a daemon thread."""
+        if self._compactor is not None or interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    print(f"⚠️ User journal compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=_run, name="user-journal-compactor", daemon=True)
+        self._compactor.start()
+
+    # ---------- migration ----------
+    def migrate_json(self, json_path: str) -> int:
+        """
+        One-time import of a legacy users_data.json. Does nothing if the store
+        has already been migrated or the file does not exist. Returns the
+        number of users imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return 0
+            with open(json_path, "r", encoding="utf-8") as f:
+                records = _legacy_records(json.load(f))
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                # Claim the migration under the write lock: another process
+                # (app / action server on the same file) may have just done it
+                claimed = self._conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                    (os.path.abspath(json_path),),
+                ).rowcount
+                if not claimed:
+                    return 0
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO user_fields (username, field, value) VALUES (?, ?, ?)",
+                    [(u, field, json.dumps(v)) for u, rec in records.items() for field, v in rec.items()],
+                )
+        print(f"✅ Migrated {len(records)} users from {json_path} into {self.path}")
+        return len(records)
+
+
+def open_user_store(path: str = DEFAULT_STORE_PATH, legacy_json: Optional[str] = "users_data.json") -> UserStore:
+    store = UserStore(path)
+    if legacy_json:
+        store.migrate_json(legacy_json)
+    # Replay whatever the journal holds from the last run, then keep compacting
+    store.compact()
+    store.start_compactor()
+    return store
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m actions.user_store [users_data.json] [users.db]
+    src = sys.argv[1] if len(sys.argv) > 1 else "users_data.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE_PATH
+    open_user_store(dst, legacy_json=src)
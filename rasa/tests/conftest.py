@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Make `actions.*` importable the same way the app does (rasa/ on sys.path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# A small catalog with the shapes the actions care about: synonym/substring
+# collisions (raincoat vs coat), shared tokens (TechPro ...), several
+# categories with prices on both sides of the usual thresholds
+PRODUCTS_CSV = """\
+product_id,product_name,category,price,rating,stock_status,delivery_time,stock_qty
+P001,TechPro Smartphone,Electronics,24999,4.5,In Stock,3-5 days,12
+P002,Atlas Smartphone,Electronics,15999,4.1,Limited,3-5 days,
+P003,TechPro Novel,Books,499,4.0,In Stock,2 days,
+P004,TechPro Cookbook,Books,899,4.3,Out of Stock,2 days,
+P005,Atlas Raincoat,Clothing,2499,4.2,In Stock,next day,
+P006,Atlas Coat,Clothing,5999,4.6,In Stock,next day,
+P007,StyleMax Tshirt,Clothing,799,3.9,In Stock,next day,
+P008,StyleMax Jeans,Clothing,1999,4.0,In Stock,next day,
+P009,Sprint Sneakers,Shoes,3499,4.4,In Stock,3-5 days,
+P010,Trail Boots,Shoes,4999,4.7,Limited,3-5 days,
+P011,Comfy Slippers,Shoes,599,3.5,In Stock,3-5 days,
+"""
+
+ORDERS_CSV = """\
+order_id,customer_name,product_name,status,delivery_time,placed_at
+ORD001,Nikhil,TechPro Smartphone,Shipped,3-5 days,2024-01-02T10:00:00
+"""
+
+SYNONYMS = {
+    "clothing": ["coat", "jacket", "tshirt"],
+    "shoes": ["sneakers", "footwear", "boots"],
+    "books": ["novel", "book"],
+    "electronics": ["gadgets", "devices"],
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A UserStore on a fresh temp SQLite file."""
+    from actions.user_store import UserStore
+
+    s = UserStore(str(tmp_path / "users.db"))
+    yield s
+    s.close()
+
+
+@pytest.fixture(scope="session")
+def shop_actions(tmp_path_factory):
+    """
+    actions.actions imported against a synthetic shop directory (catalog,
+    orders, synonyms, user store), with the background reloader disabled.
+    """
+    root = tmp_path_factory.mktemp("shop")
+    (root / "products.csv").write_text(PRODUCTS_CSV, encoding="utf-8")
+    (root / "orders.csv").write_text(ORDERS_CSV, encoding="utf-8")
+    (root / "synonyms.json").write_text(json.dumps(SYNONYMS), encoding="utf-8")
+
+    cwd = os.getcwd()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PRODUCTS_PATH", str(root / "products.csv"))
+        mp.setenv("CATALOG_RELOAD_INTERVAL", "0")
+        mp.setenv("USER_STORE_PATH", str(root / "users.db"))
+        mp.setenv("USER_JOURNAL_COMPACT_INTERVAL", "0")
+        mp.setenv("SEARCH_CACHE_STATS_INTERVAL", "0")
+        os.chdir(root)
+        try:
+            from actions import actions as module
+        finally:
+            os.chdir(cwd)
+    return module
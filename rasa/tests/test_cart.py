@@ -0,0 +1,71 @@
+# Quantity-aggregated carts keyed by SKU, and conversion of legacy list carts.
+
+import json
+
+from actions.cart import Cart, cart_key
+
+
+def test_adding_a_product_again_bumps_its_quantity():
+    cart = Cart()
+    assert cart.add("TechPro Smartphone", 100, sku="P1") == "P1"
+    cart.add("TechPro Smartphone", 120, sku="P1")  # keeps the first price snapshot
+    cart.add("Atlas Boots", 50)
+    assert cart.to_payload() == {
+        "P1": {"name": "TechPro Smartphone", "price": 100.0, "qty": 2},
+        "name:atlas boots": {"name": "Atlas Boots", "price": 50.0, "qty": 1},
+    }
+    assert len(cart) == 2
+    assert cart.quantity() == 3
+
+
+def test_remove_takes_one_unit_unless_asked_for_the_line():
+    cart = Cart()
+    cart.add("TechPro Smartphone", 100, qty=3, sku="P1")
+    assert cart.remove("P1")
+    assert cart.lines["P1"]["qty"] == 2
+    assert cart.remove("P1", qty=None)
+    assert not cart
+    assert not cart.remove("P1")
+
+
+def test_find_and_items():
+    cart = Cart()
+    cart.add("TechPro Smartphone", 100, sku="P1")
+    cart.add("Atlas  Boots", 50)
+    assert cart.find("techpro smartphone") == "P1"
+    assert cart.find("ATLAS BOOTS") == cart_key("atlas boots")
+    assert cart.find("Trail Boots") is None
+    assert [(i["key"], i["sku"]) for i in cart.items()] == [("P1", "P1"), ("name:atlas boots", None)]
+
+
+def test_legacy_list_carts_are_aggregated():
+    legacy = [
+        {"name": "Atlas Boots", "price": 50.0},
+        {"name": "atlas  boots", "price": 50.0},
+        {"product": "TechPro Smartphone", "price": 100.0, "qty": 2, "sku": "P1"},
+        "not an item",
+    ]
+    assert Cart.from_payload(legacy).to_payload() == {
+        "name:atlas boots": {"name": "Atlas Boots", "price": 50.0, "qty": 2},
+        "P1": {"name": "TechPro Smartphone", "price": 100.0, "qty": 2},
+    }
+    assert Cart.from_payload(None).to_payload() == {}
+    # The stored dict form round-trips unchanged
+    payload = Cart.from_payload(legacy).to_payload()
+    assert Cart.from_payload(payload).to_payload() == payload
+
+
+def test_imported_legacy_cart_is_rewritten_by_the_first_journal_event(store, tmp_path):
+    legacy = tmp_path / "users_data.json"
+    legacy.write_text(json.dumps({"alice": {"password": "pw", "cart": [
+        {"name": "Atlas Boots", "price": 50.0},
+        {"product": "TechPro Smartphone", "price": 100.0, "qty": 2, "sku": "P1"},
+    ]}}))
+    store.migrate_json(str(legacy))
+
+    store.append_event("alice", "cart_remove", {"key": "P1"})
+    store.compact()
+    assert store.get_field("alice", "cart") == {
+        "name:atlas boots": {"name": "Atlas Boots", "price": 50.0, "qty": 1},
+        "P1": {"name": "TechPro Smartphone", "price": 100.0, "qty": 1},
+    }
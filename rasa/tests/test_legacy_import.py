@@ -0,0 +1,76 @@
+# One-time import of a legacy users_data.json into the user store.
+
+import json
+import threading
+
+from actions.user_store import UserStore
+
+LEGACY_USERS = {
+    "alice": {"password": "pw", "cart": [{"name": "Atlas Boots", "price": 50.0}], "address": "app copy"},
+    "users": {
+        "alice": {"password": "old", "address": "actions copy"},
+        "bob": {"password": "pw2", "cart": []},
+    },
+    "carol": "pw3",
+}
+
+
+def _legacy_file(tmp_path):
+    path = tmp_path / "users_data.json"
+    path.write_text(json.dumps(LEGACY_USERS), encoding="utf-8")
+    return str(path)
+
+
+def test_import_reads_every_legacy_shape(store, tmp_path):
+    assert store.migrate_json(_legacy_file(tmp_path)) == 3
+    assert sorted(store.usernames()) == ["alice", "bob", "carol"]
+    # App-format records win over the actions-format copy of the same user
+    assert store.check_password("alice", "pw")
+    assert store.get_field("alice", "address") == "app copy"
+    assert store.check_password("bob", "pw2")
+    assert store.check_password("carol", "pw3")
+
+
+def test_import_runs_once(store, tmp_path):
+    path = _legacy_file(tmp_path)
+    assert store.migrate_json(path) == 3
+    store.set_fields("carol", {"password": "changed"})
+    assert store.migrate_json(path) == 0
+    assert store.check_password("carol", "changed")
+
+
+def test_missing_legacy_file_is_not_an_error(store, tmp_path):
+    assert store.migrate_json(str(tmp_path / "nope.json")) == 0
+    assert store.usernames() == []
+
+
+def _race_first_open(path, db, n):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def open_and_migrate():
+        store = UserStore(db)
+        try:
+            barrier.wait()
+            results.append(store.migrate_json(path))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            store.close()
+
+    threads = [threading.Thread(target=open_and_migrate) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_first_opens_import_exactly_once(tmp_path):
+    # The app and the action server starting together on a fresh shared store;
+    # several rounds, since the race window is narrow
+    path = _legacy_file(tmp_path)
+    for round_no in range(10):
+        results, errors = _race_first_open(path, str(tmp_path / f"users{round_no}.db"), 4)
+        assert errors == []
+        assert sorted(results) == [0, 0, 0, 3]
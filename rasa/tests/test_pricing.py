@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+import pytest
+
+from actions import pricing
+from actions.pricing import CartPricer, money, price_cart
+
+
+@pytest.fixture(autouse=True)
+def restore_rules():
+    coupons, rules = dict(pricing.COUPONS), pricing.RULES
+    yield
+    pricing.COUPONS.clear()
+    pricing.COUPONS.update(coupons)
+    pricing.RULES = rules
+
+
+def test_money_is_exact_and_rounds_half_up():
+    assert money(0.1) + money(0.2) == Decimal("0.30")
+    assert money("2.345") == Decimal("2.35")
+    assert money(None) == Decimal("0.00")
+
+
+def test_totals_without_coupon():
+    totals = price_cart([{"price": 499.99, "qty": 2}])
+    assert totals.as_floats() == (999.98, 0.0, 0.0, 180.0, 1179.98)
+
+
+def test_percent_coupon_applies_before_shipping_and_tax():
+    # 10% off drops the order under the free-shipping threshold
+    totals = price_cart([{"price": 499.99, "qty": 2}], "save10")
+    assert (totals.subtotal, totals.discount, totals.shipping, totals.tax, totals.total) == (
+        Decimal("999.98"), Decimal("100.00"), Decimal("49.00"), Decimal("162.00"), Decimal("1110.98"),
+    )
+
+
+def test_flat_coupon_never_exceeds_the_subtotal():
+    assert price_cart([{"price": 60}], "FREE").discount == Decimal("60.00")
+    assert price_cart([{"price": 600}], {"code": "FREE"}).discount == Decimal("100.00")
+
+
+def test_retired_coupon_keeps_its_saved_terms():
+    saved = {"code": "OLD20", "type": "percent", "value": 20}
+    assert price_cart([{"price": 100}], saved).discount == Decimal("20.00")
+    assert price_cart([{"price": 100}], "OLD20").discount == Decimal("0.00")
+
+
+def test_price_of_overrides_the_snapshot():
+    items = [{"sku": "P1", "price": 100, "qty": 2}]
+    assert price_cart(items, price_of=lambda it: 150).subtotal == Decimal("300.00")
+
+
+def test_rule_changes_invalidate_cached_quotes():
+    pricer = CartPricer()
+    items = [{"price": 100, "qty": 1}]
+    first = pricer.quote("alice", 1, items)
+    assert pricer.quote("alice", 1, [{"price": 999, "qty": 1}]) is first  # same cart version: cached
+
+    pricing.set_price_rules(tax_rate="0.12")
+    assert pricer.quote("alice", 1, items).tax == Decimal("12.00")
+
+    pricing.register_coupon("HALF", "percent", 50)
+    assert pricer.quote("alice", 1, items, "HALF").discount == Decimal("50.00")
+    assert pricer.quote("alice", 2, items, "SAVE10").discount == Decimal("10.00")
+
+
+def test_reprice_many_uses_current_rules():
+    pricer = CartPricer()
+    carts = [("alice", 1, [{"price": 100}], None), ("bob", 4, [{"price": 200}], "SAVE10")]
+    pricer.quote("alice", 1, carts[0][2])
+    pricing.set_price_rules(shipping_fee=0)
+    out = pricer.reprice_many(carts)
+    assert out["alice"].total == Decimal("118.00")
+    assert out["bob"].total == Decimal("212.40")
+    assert pricer.quote("alice", 1, carts[0][2]) == out["alice"]
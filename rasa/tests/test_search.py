@@ -0,0 +1,72 @@
+import base64
+import json
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+
+def _cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def _show_more(module, cursor):
+    tracker = Tracker("alice", {}, {
+        "text": "/show_more_products", "intent": {},
+        "entities": [{"entity": "search_cursor", "value": cursor}],
+    }, [], False, None, {}, "")
+    dispatcher = CollectingDispatcher()
+    events = module.ActionShowMoreProducts().run(dispatcher, tracker, {})
+    return dispatcher.messages, events
+
+
+def test_search_cursor_round_trips(shop_actions):
+    state = {"q": "shoes", "c": None, "s": 7, "o": 2}
+    assert shop_actions._decode_search_cursor(shop_actions._encode_search_cursor(state)) == state
+
+
+@pytest.mark.parametrize("cursor", [
+    _cursor({"q": "shoes", "o": 2}),                 # no seed
+    _cursor({"q": "shoes", "s": 7, "o": "two"}),     # non-integer offset
+    _cursor({"q": "shoes", "s": 7, "o": -1}),
+    _cursor({"q": "shoes", "s": 2**40, "o": 0}),     # seed out of numpy's range
+    _cursor({"q": "shoes", "s": True, "o": 0}),
+    _cursor({"q": ["shoes"], "s": 7, "o": 0}),
+    _cursor({"q": "shoes", "c": 3, "s": 7, "o": 0}),
+    _cursor(["q", "s", "o"]),
+    "not base64 at all!",
+])
+def test_bad_cursor_means_no_more_products(shop_actions, cursor):
+    assert shop_actions._decode_search_cursor(cursor) is None
+    messages, events = _show_more(shop_actions, cursor)
+    assert messages[0]["text"] == "There are no more products to show. Try a new search!"
+    assert events[0]["value"] is None
+
+
+def _names(df):
+    return sorted(df["product_name"])
+
+
+def test_in_price_range_bounds_are_inclusive(shop_actions):
+    catalog = shop_actions.CATALOG
+    assert _names(catalog.in_price_range("clothing", 799, 2499)) == [
+        "Atlas Raincoat", "StyleMax Jeans", "StyleMax Tshirt",
+    ]
+    assert _names(catalog.in_price_range("Clothing", None, 798)) == []
+    assert _names(catalog.in_price_range("clothing", 5000, None)) == ["Atlas Coat"]
+    assert len(catalog.in_price_range("clothing")) == 4
+    assert catalog.in_price_range("furniture", 0, 10**6).empty
+    assert catalog.in_price_range(None).empty
+
+
+def test_price_only_follow_up_uses_the_remembered_category(shop_actions):
+    ranked, category = shop_actions.search_catalog("under 1000", "clothing")
+    assert category == "clothing"
+    assert _names(ranked) == ["StyleMax Tshirt"]
+
+
+@pytest.mark.parametrize("message", ["sneakers above 1000", "shoes above 1000"])
+def test_a_named_category_beats_the_remembered_one(shop_actions, message):
+    ranked, category = shop_actions.search_catalog(message, "clothing")
+    assert category == "shoes"
+    assert _names(ranked) == ["Sprint Sneakers", "Trail Boots"]
@@ -0,0 +1,72 @@
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+
+def _check_stock(module, text):
+    tracker = Tracker("alice", {}, {"text": text, "intent": {}, "entities": []}, [], False, None, {}, "")
+    dispatcher = CollectingDispatcher()
+    module.ActionCheckStock().run(dispatcher, tracker, {})
+    return dispatcher.messages[0]
+
+
+def test_stock_reports_the_named_product(shop_actions):
+    message = _check_stock(shop_actions, "is techpro cookbook in stock")
+    assert [s["product_name"] for s in message["custom"]["stock"]] == ["TechPro Cookbook"]
+    assert "Out of Stock" in message["text"]
+
+
+def test_stock_fuzzy_match_tolerates_typos(shop_actions):
+    message = _check_stock(shop_actions, "is techpro cookbok available")
+    assert [s["product_name"] for s in message["custom"]["stock"]] == ["TechPro Cookbook"]
+
+
+def test_stock_does_not_answer_for_a_weak_fuzzy_match(shop_actions):
+    # Shares a token / substring with catalog names but is not any of them
+    for text in ("is pizza oven in stock", "is bookshelf available"):
+        message = _check_stock(shop_actions, text)
+        assert message["text"] == "I couldn't find that product in our stock.", text
+        assert not message["custom"]
+
+
+def test_best_fuzzy_match_ignores_scores_under_the_cutoff(shop_actions):
+    names = ["techpro novel", "techpro cookbook"]
+    scores = shop_actions.fuzzy_scores(["pizza oven"], names, shop_actions.ADD_TO_CART_MATCH_SCORE)[0]
+    assert shop_actions.best_fuzzy_match(names, scores) == (None, 0)
+
+
+def _catalog(module, qty):
+    import pandas as pd
+
+    return module.CatalogIndex(pd.DataFrame({
+        "product_id": ["S1", "S2"],
+        "product_name": ["Widget", "Gadget"],
+        "category": ["misc", "misc"],
+        "price": [10.0, 20.0],
+        "stock_status": ["In Stock", "Limited"],
+        "stock_qty": [qty, None],
+    }))
+
+
+def test_stock_counters_follow_catalog_edits_but_keep_live_changes(shop_actions):
+    stock = shop_actions.StockCounters(_catalog(shop_actions, 10))
+    assert stock.adjust("S1", -7) == 3
+    assert stock.adjust("S2", -1) is None  # no unit count: catalog status only
+
+    # A reload with the same stock_qty keeps the live count...
+    stock.sync_catalog(_catalog(shop_actions, 10))
+    assert stock.lookup(["S1", "S2"]) == [
+        {"sku": "S1", "stock_status": "Limited", "quantity": 3},
+        {"sku": "S2", "stock_status": "Limited", "quantity": None},
+    ]
+    # ...and an edited one (a restock in products.csv) replaces it
+    stock.sync_catalog(_catalog(shop_actions, 50))
+    assert stock.lookup(["S1"])[0]["quantity"] == 50
+
+
+def test_checkout_takes_sold_units_off_stock(shop_actions):
+    before = shop_actions.STOCK.lookup(["P001"])[0]["quantity"]
+    cart = {"P001": {"name": "TechPro Smartphone", "price": 24999.0, "qty": 2}}
+    tracker = Tracker("alice", {"cart": cart}, {"text": "checkout", "intent": {}, "entities": []},
+                      [], False, None, {}, "")
+    shop_actions.ActionCheckout().run(CollectingDispatcher(), tracker, {})
+    assert shop_actions.STOCK.lookup(["P001"])[0]["quantity"] == before - 2
@@ -0,0 +1,42 @@
+import pytest
+
+
+@pytest.fixture
+def rewriter(shop_actions):
+    return shop_actions.SynonymRewriter({
+        "clothing": ["coat", "jacket"],
+        "shoes": ["sneakers", "boots"],
+        "books": ["book", "novel", "comic book"],
+        "electronics": ["books reader"],
+    })
+
+
+def test_synonym_inside_a_longer_word_is_left_alone(rewriter):
+    # "coat" is a clothing synonym, but "raincoat" is a product name
+    assert rewriter.rewrite("atlas raincoat") == ("atlas raincoat", [])
+    assert rewriter.rewrite("coats and coat") == ("coats and clothing", ["clothing"])
+
+
+def test_longest_synonym_wins(rewriter):
+    assert rewriter.rewrite("a comic book please") == ("a books please", ["books"])
+
+
+def test_replacements_are_not_rewritten_again(rewriter):
+    # "book" -> "books", and "books reader" must not then fire on the output
+    assert rewriter.rewrite("book reader") == ("books reader", ["books"])
+
+
+def test_categories_are_reported_once_in_order(rewriter):
+    text, hits = rewriter.rewrite("boots, a jacket and more boots")
+    assert text == "shoes, a clothing and more shoes"
+    assert hits == ["shoes", "clothing"]
+
+
+def test_empty_synonyms(shop_actions):
+    assert shop_actions.SynonymRewriter({}).rewrite("anything") == ("anything", [])
+
+
+def test_search_keeps_raincoat_results_apart_from_coats(shop_actions):
+    ranked, _ = shop_actions.search_catalog("raincoat", None)
+    assert "Atlas Raincoat" in set(ranked["product_name"])
+    assert set(ranked["category"].str.lower()) == {"clothing"}
@@ -0,0 +1,67 @@
+# Cart/order journal and compaction of the SQLite user store, each test
+# against its own temp database (the `store` fixture).
+
+import pytest
+
+from actions.user_store import UserStore
+
+
+def _add(store, username, name, price, sku=None, **kwargs):
+    return store.append_event(username, "cart_add", {"item": {"name": name, "price": price, "sku": sku}}, **kwargs)
+
+
+def test_journal_fold_matches_after_compaction(store, tmp_path):
+    store.create_user("alice", "pw")
+    _add(store, "alice", "TechPro Smartphone", 100.0, sku="P1")
+    _add(store, "alice", "TechPro Smartphone", 100.0, sku="P1")
+    _add(store, "alice", "Atlas Boots", 50.0)
+    store.append_event("alice", "cart_remove", {"name": "atlas boots"})
+    store.append_event("alice", "coupon_apply", {"coupon": {"code": "SAVE10", "type": "percent", "value": 10}})
+
+    folded = store.get_user("alice")
+    assert folded["cart"] == {"P1": {"name": "TechPro Smartphone", "price": 100.0, "qty": 2}}
+    assert folded["coupon"]["code"] == "SAVE10"
+    assert store.pending_event_count() == 5
+
+    assert store.compact() == 1
+    assert store.pending_event_count() == 0
+    assert store.get_user("alice") == folded
+
+    # A fresh connection (e.g. after a restart) sees the same record
+    reopened = UserStore(str(tmp_path / "users.db"))
+    try:
+        assert reopened.get_user("alice") == folded
+    finally:
+        reopened.close()
+
+
+def test_checkout_event_moves_cart_to_orders(store):
+    store.create_user("alice", "pw")
+    _add(store, "alice", "Atlas Boots", 50.0, sku="P2")
+    store.append_event("alice", "coupon_apply", {"coupon": {"code": "LESS50", "type": "flat", "value": 50}})
+    store.append_event("alice", "checkout", {"order": {"order_id": "ORD1", "items": []}})
+
+    record = store.get_user("alice")
+    assert record["cart"] == {}
+    assert "coupon" not in record
+    assert [o["order_id"] for o in record["orders"]] == ["ORD1"]
+
+
+def test_overwriting_a_journaled_field_discards_pending_events(store):
+    store.create_user("alice", "pw")
+    _add(store, "alice", "Atlas Boots", 50.0, sku="P2")
+    store.set_fields("alice", {"cart": {}})
+    _add(store, "alice", "Lumina Smartphone", 10.0, sku="P3")
+
+    assert list(store.get_user("alice")["cart"]) == ["P3"]
+    store.compact()
+    assert list(store.get_user("alice")["cart"]) == ["P3"]
+
+
+def test_unknown_event_is_rejected_before_writing(store):
+    store.create_user("alice", "pw")
+    version = store.version("alice")
+    with pytest.raises(ValueError):
+        store.append_event("alice", "cart_explode", {})
+    assert store.version("alice") == version
+    assert store.pending_event_count() == 0
@@ -0,0 +1,65 @@
+# Per-user optimistic versioning: stale writes are rejected, update_user retries.
+
+import threading
+
+import pytest
+
+from actions.user_store import VersionConflict
+
+
+def _add(store, username, name, price, **kwargs):
+    return store.append_event(username, "cart_add", {"item": {"name": name, "price": price}}, **kwargs)
+
+
+def test_stale_writes_raise_version_conflict(store):
+    store.create_user("alice", "pw")
+    _, version = store.get_user_version("alice")
+
+    # Another session writes in between
+    _add(store, "alice", "Atlas Boots", 50.0)
+
+    with pytest.raises(VersionConflict) as exc:
+        store.set_fields("alice", {"address": "somewhere"}, expected_version=version)
+    assert exc.value.expected == version
+    assert exc.value.actual == version + 1
+    with pytest.raises(VersionConflict):
+        store.append_event("alice", "checkout", {"order": {"order_id": "ORD1"}}, expected_version=version)
+
+    # Nothing from the rejected writes landed
+    record = store.get_user("alice")
+    assert "address" not in record
+    assert record["orders"] == []
+    assert store.set_fields("alice", {"address": "somewhere"}, expected_version=version + 1) == version + 2
+
+
+def test_concurrent_update_user_loses_no_updates(store):
+    store.create_user("alice", "pw")
+    store.set_fields("alice", {"counter": 0})
+
+    def bump():
+        for _ in range(25):
+            store.update_user("alice", lambda rec: {"counter": rec["counter"] + 1}, retries=1000)
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store.get_field("alice", "counter") == 100
+
+
+def test_versions_are_shared_between_connections(store):
+    # The app and the action server each hold their own connection to one file
+    from actions.user_store import UserStore
+
+    other = UserStore(store.path)
+    try:
+        store.create_user("alice", "pw")
+        _, version = other.get_user_version("alice")
+        store.set_fields("alice", {"address": "from the app"})
+        with pytest.raises(VersionConflict):
+            other.set_fields("alice", {"address": "from the action server"}, expected_version=version)
+        assert other.get_field("alice", "address") == "from the app"
+    finally:
+        other.close()